@@ -2,10 +2,264 @@
 # XN Wang
 # 2022/08/17
 
-import gurobipy as grb
-from gurobipy import GRB
+import os
+import time
+import pickle
+import hashlib
+import pandas as pd
+import numpy as np
+from collections import OrderedDict
+from bisect import bisect_right, insort
+from opt_backend import *
 
-def model_complete_reschedule(req_index_list, ns_start, ns_length, num_items, item_exp_release_time, t, T):
+# constraint counts and build/solve times per formulation: {formulation: {'calls', 'total_rows', 'max_rows', ...}}
+formulation_stats = {}
+
+def record_formulation_stats(formulation, num_rows, build_time, solve_time):
+    stats = formulation_stats.setdefault(formulation, {'calls': 0, 'total_rows': 0, 'max_rows': 0,
+                                                       'build_time': 0.0, 'solve_time': 0.0})
+    stats['calls'] += 1
+    stats['total_rows'] += num_rows
+    stats['max_rows'] = max(stats['max_rows'], num_rows)
+    stats['build_time'] += build_time
+    stats['solve_time'] += solve_time
+
+def report_formulation_stats():
+    stats_df = pd.DataFrame.from_dict(formulation_stats, orient='index')
+    stats_df['avg_rows'] = stats_df['total_rows'] / stats_df['calls']
+    return stats_df
+
+# latency histogram bins in seconds: 0, 10us, 100us, ..., 10s, inf
+LATENCY_BIN_EDGES = np.concatenate([[0.0], 10.0 ** np.arange(-5, 2), [np.inf]])
+TELEMETRY_COLUMNS = ['kind', 'formulation', 'backend', 'num_vars', 'num_rows', 'build_time', 'solve_time',
+                     'fallback_time', 'node_count', 'mip_gap', 'status', 'outcome']
+
+class SolveTelemetry:
+    # One row per schedule solve call (kind: admission, batch admission or delay). outcome is optimal, incumbent
+    # (solver's best when the time limit ran out), greedy (the fallback beat the incumbent) or failed.
+    # Latency is build + solve + fallback time.
+    def __init__(self):
+        self.rows = []
+
+    def record(self, kind, formulation, backend, num_vars, num_rows, build_time, solve_time, fallback_time,
+               node_count, mip_gap, status, outcome):
+        self.rows.append(dict(zip(TELEMETRY_COLUMNS, [kind, formulation, backend, num_vars, num_rows, build_time, solve_time,
+                                                      fallback_time, node_count, mip_gap, status, outcome])))
+
+    def to_frame(self):
+        telemetry_df = pd.DataFrame(self.rows, columns=TELEMETRY_COLUMNS)
+        telemetry_df['latency'] = telemetry_df['build_time'] + telemetry_df['solve_time'] + telemetry_df['fallback_time']
+        return telemetry_df
+
+    def latencies(self):
+        return np.array([row['build_time'] + row['solve_time'] + row['fallback_time'] for row in self.rows])
+
+    def latency_percentile(self, q):
+        latencies = self.latencies()
+        return float(np.percentile(latencies, q)) if len(latencies) else None
+
+    def latency_histogram(self, bin_edges=LATENCY_BIN_EDGES):
+        counts, _ = np.histogram(self.latencies(), bins=bin_edges)
+        return counts
+
+def record_model_solve(telemetry, kind, formulation, model, build_time, fallback_time, outcome):
+    record_formulation_stats(formulation, len(model.rows), build_time, model.runtime)
+    if telemetry is not None:
+        telemetry.record(kind, formulation, model.backend, len(model.lb), len(model.rows), build_time, model.runtime,
+                         fallback_time, model.node_count, model.mip_gap, model.status, outcome)
+
+class ScheduleSolveCache:
+    # Bounded LRU cache of (obj_val, updated_assign) for complete reschedule solves, keyed by a canonical hash of the
+    # inputs. t only matters through which requests start before it, so it enters the key that way and identical
+    # schedules hit across periods too. tag tells apart solvers that may pick different optimal assignments.
+    # With file_name the entries are merged into that pickle file on save and loaded back on the next run.
+    # Only optimal solves are stored: a time-limited incumbent or fallback depends on the limit and the machine.
+    def __init__(self, max_size=10000, file_name=None):
+        self.max_size = max_size
+        self.file_name = file_name
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if file_name is not None and os.path.exists(file_name):
+            self.load()
+
+    @staticmethod
+    def make_key(tag, req_index_list, ns_start, ns_length, item_exp_release_time, t, T):
+        reqs = tuple(sorted((int(j), float(ns_start[j]), float(ns_length[j]), bool(ns_start[j] < t)) for j in req_index_list))
+        release = tuple(sorted((int(i), float(rt)) for i, rt in item_exp_release_time.items()))
+        return hashlib.sha1(repr((tag, reqs, release, int(T))).encode()).hexdigest()
+
+    def get(self, key):
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            obj_val, updated_assign = self.entries[key]
+            return obj_val, dict(updated_assign) # callers keep and change the assignment
+        self.misses += 1
+
+    def put(self, key, obj_val, updated_assign):
+        self.entries[key] = (obj_val, dict(updated_assign))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def cached(self, solve, tag, telemetry=None):
+        # solve with the model_complete_reschedule signature, answered from the cache when possible
+        def cached_solve(req_index_list, ns_start, ns_length, num_items, item_exp_release_time, t, T, **kwargs):
+            lookup_start = time.time()
+            key = self.make_key(tag, req_index_list, ns_start, ns_length, item_exp_release_time, t, T)
+            result = self.get(key)
+            if result is not None:
+                if telemetry is not None:
+                    telemetry.record(kwargs.get('kind', "reschedule"), "cache", None, 0, 0, 0.0, time.time() - lookup_start,
+                                     0.0, 0, None, None, "cached")
+                return result
+            # the solve records into its own telemetry so its outcome is known, then the rows go on to the caller's
+            solve_telemetry = SolveTelemetry()
+            obj_val, updated_assign = solve(req_index_list, ns_start, ns_length, num_items, item_exp_release_time, t, T,
+                                            telemetry=solve_telemetry, **kwargs)
+            if telemetry is not None:
+                telemetry.rows.extend(solve_telemetry.rows)
+            if solve_telemetry.rows and solve_telemetry.rows[-1]['outcome'] == "optimal":
+                self.put(key, obj_val, updated_assign)
+            return obj_val, updated_assign
+        return cached_solve
+
+    def load(self):
+        with open(self.file_name, 'rb') as f:
+            self.entries.update(pickle.load(f))
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def save(self):
+        # merge with what other runs saved meanwhile, then replace the file in one step
+        if self.file_name is None:
+            return
+        entries = OrderedDict()
+        if os.path.exists(self.file_name):
+            with open(self.file_name, 'rb') as f:
+                entries.update(pickle.load(f))
+        entries.update(self.entries)
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+        tmp_file_name = self.file_name + '.%d.tmp' % os.getpid()
+        with open(tmp_file_name, 'wb') as f:
+            pickle.dump(entries, f)
+        os.replace(tmp_file_name, self.file_name)
+
+# one cache per (max_size, file_name) in a process, shared by every simulator run there (e.g. run_replicas workers)
+solve_caches = {}
+
+def get_solve_cache(max_size, file_name=None):
+    if (max_size, file_name) not in solve_caches:
+        solve_caches[max_size, file_name] = ScheduleSolveCache(max_size, file_name)
+    return solve_caches[max_size, file_name]
+
+
+def model_complete_reschedule(req_index_list, ns_start, ns_length, num_items, item_exp_release_time, t, T, backend=None,
+                              formulation="dense", time_limit=None, telemetry=None, kind="reschedule"):
+    # time_limit (seconds, None for no limit) caps the solve; when it runs out the better of the solver's incumbent
+    # and sweep_complete_reschedule is returned
+    build_start = time.time()
+    model = OptModel("complete reschedule", backend, time_limit)
+    add_reschedule = add_sparse_reschedule if formulation == "sparse" else add_dense_reschedule
+    y, get_assign = add_reschedule(model, req_index_list, ns_start, ns_length, num_items, item_exp_release_time, t, T)
+    model.set_objective(quicksum(y[j] for j in req_index_list), MAXIMIZE)
+
+    build_time = time.time() - build_start
+    model.optimize()
+    # print("Model runtime: ", model.runtime)
+    fallback_time = 0.0
+    if model.status == OPTIMAL:
+        outcome = "optimal"
+        obj_val, updated_assign = model.obj_val, get_assign()
+    elif model.status == TIME_LIMIT:
+        fallback_start = time.time()
+        outcome = "greedy"
+        obj_val, updated_assign = sweep_complete_reschedule(req_index_list, ns_start, ns_length, num_items, item_exp_release_time, t, T)
+        if model.values is not None and model.obj_val >= obj_val:
+            outcome = "incumbent"
+            obj_val, updated_assign = model.obj_val, get_assign()
+        fallback_time = time.time() - fallback_start
+    else:
+        print("Model is either infeasible or unbounded. DEBUG!")
+        outcome = "failed"
+        obj_val, updated_assign = 0, {}
+    record_model_solve(telemetry, kind, formulation, model, build_time, fallback_time, outcome)
+    return obj_val, updated_assign
+
+
+def model_batch_admission(req_index_list, new_req_index_list, ns_start, ns_length, num_items, item_exp_release_time, t, T,
+                          rule="prefix", backend=None, formulation="dense", time_limit=None, telemetry=None, kind="batch admission"):
+    # One solve for a whole batch of new requests (new_req_index_list, in priority order) on top of the requests
+    # already on the schedule (req_index_list), which must all stay. rule prefix admits the longest prefix of the
+    # batch; otherwise the most requests are admitted, ties going to the higher priority ones (integer weights, a
+    # priority bonus never outweighs one more admission). Returns the admitted requests and the new assignment.
+    # When time_limit runs out, the better of the solver's incumbent and greedy_batch_admission is returned.
+    build_start = time.time()
+    model = OptModel("batch admission", backend, time_limit)
+    add_reschedule = add_sparse_reschedule if formulation == "sparse" else add_dense_reschedule
+    y, get_assign = add_reschedule(model, req_index_list + new_req_index_list, ns_start, ns_length, num_items,
+                                   item_exp_release_time, t, T)
+    model.add_constrs(y[j] == 1 for j in req_index_list)
+
+    K = len(new_req_index_list)
+    if rule == "prefix":
+        model.add_constrs(y[new_req_index_list[r+1]] <= y[new_req_index_list[r]] for r in range(K - 1))
+        weights = [1] * K
+    else:
+        weights = [K*K + 1 + K - rank for rank in range(K)]
+    model.set_objective(quicksum(weights[rank] * y[j] for rank, j in enumerate(new_req_index_list)), MAXIMIZE)
+
+    build_time = time.time() - build_start
+    model.optimize()
+    fallback_time = 0.0
+    if model.status == OPTIMAL:
+        outcome = "optimal"
+        updated_assign = get_assign()
+        admitted = [j for j in new_req_index_list if j in updated_assign]
+    elif model.status == TIME_LIMIT:
+        fallback_start = time.time()
+        outcome = "greedy"
+        admitted, updated_assign = greedy_batch_admission(req_index_list, new_req_index_list, ns_start, ns_length, num_items,
+                                                          item_exp_release_time, t, T, rule)
+        if model.values is not None:
+            incumbent_assign = get_assign()
+            score = lambda assign: sum(weights[rank] for rank, j in enumerate(new_req_index_list) if j in assign)
+            if score(incumbent_assign) >= score(updated_assign):
+                outcome = "incumbent"
+                updated_assign = incumbent_assign
+                admitted = [j for j in new_req_index_list if j in updated_assign]
+        fallback_time = time.time() - fallback_start
+    else: # requests on the schedule cannot all stay (e.g. one starts before t), nothing is admitted
+        outcome = "failed"
+        admitted, updated_assign = [], {}
+    record_model_solve(telemetry, kind, formulation, model, build_time, fallback_time, outcome)
+    return admitted, updated_assign
+
+
+def greedy_batch_admission(req_index_list, new_req_index_list, ns_start, ns_length, num_items, item_exp_release_time, t, T, rule="prefix"):
+    # Fallback for model_batch_admission: the batch is admitted one request at a time in priority order with the
+    # sweep check, stopping at the first rejection for rule prefix
+    on_schedule = list(req_index_list)
+    obj_val, updated_assign = sweep_complete_reschedule(on_schedule, ns_start, ns_length, num_items, item_exp_release_time, t, T)
+    if obj_val < len(on_schedule):
+        return [], {}
+    admitted = []
+    for j in new_req_index_list:
+        obj_val, assign = sweep_complete_reschedule(on_schedule + [j], ns_start, ns_length, num_items, item_exp_release_time, t, T)
+        if obj_val == len(on_schedule) + 1:
+            on_schedule.append(j)
+            admitted.append(j)
+            updated_assign = assign
+        elif rule == "prefix":
+            break
+    return admitted, updated_assign
+
+
+def add_dense_reschedule(model, req_index_list, ns_start, ns_length, num_items, item_exp_release_time, t, T):
+    # Adds the complete reschedule variables and constraints to model; returns y (is j scheduled) and a function
+    # reading the item assignment {req: item} from the solved model
     # config
     Q = 5 * T
 
@@ -17,29 +271,212 @@ def model_complete_reschedule(req_index_list, ns_start, ns_length, num_items, it
             L_mat_delivery_window_dict[j, k] = 1 if ns_start[j] <= ns_start[k] else 0
             R_mat_return_window_dict[j, k] = 1 if ns_start[j] + ns_length[j] <= ns_start[k] + ns_length[k] else 0
 
-    model = grb.Model("complete reschedule")
+    y = model.add_vars(req_index_list, vtype=BINARY)
+    x = model.add_vars(item_list, req_index_list, vtype=BINARY)
 
-    y = model.addVars(req_index_list, vtype=GRB.BINARY, name='yj')
-    x = model.addVars(item_list, req_index_list, vtype=GRB.BINARY, name='xij')
-
-    model.setObjective(sum(y[j] for j in req_index_list), GRB.MAXIMIZE)
-    model.addConstrs(sum(x[i,j] for i in item_list) == y[j] for j in req_index_list)
-    model.addConstrs((ns_length[j] - (1 - L_mat_delivery_window_dict[j,k])*Q - (2-x[i,j]-x[i,k])*Q <= ns_start[k] - ns_start[j])\
+    model.add_constrs(quicksum(x[i,j] for i in item_list) == y[j] for j in req_index_list)
+    model.add_constrs((ns_length[j] - (1 - L_mat_delivery_window_dict[j,k])*Q - (2-x[i,j]-x[i,k])*Q <= ns_start[k] - ns_start[j])\
                      for i in item_list for j in req_index_list for k in req_index_list if j!= k)
-    model.addConstrs((ns_length[j] - (1 - R_mat_return_window_dict[j,k])*Q - (2-x[i,j]-x[i,k])*Q <= ns_start[k] - ns_start[j])\
+    model.add_constrs((ns_length[j] - (1 - R_mat_return_window_dict[j,k])*Q - (2-x[i,j]-x[i,k])*Q <= ns_start[k] - ns_start[j])\
                      for i in item_list for j in req_index_list for k in req_index_list if j != k)
-    model.addConstrs((item_exp_release_time[i]-(1-x[i,j])*Q <= ns_start[j]) for i in item_list for j in req_index_list)
+    model.add_constrs((item_exp_release_time[i]-(1-x[i,j])*Q <= ns_start[j]) for i in item_list for j in req_index_list)
 
     # auxiliary constr: every nominal schedule should start after current time
-    model.addConstrs(y[j] == 0 for j in req_index_list if ns_start[j] < t)
+    model.add_constrs(y[j] == 0 for j in req_index_list if ns_start[j] < t)
 
-    model.setParam('OutputFlag', 0)
-    model.optimize()
-    # print("Model runtime: ", model.Runtime)
-    if model.status == GRB.OPTIMAL:
-        updated_assign = {j:i for j in req_index_list for i in item_list if model.getVarByName("xij[%d,%d]"%(i,j)).X == 1}
-        return model.objVal, updated_assign
-    else:
-        print("Model is either infeasible or unbounded. DEBUG!")
-        return 0, {}
+    def get_assign():
+        return {j:i for j in req_index_list for i in item_list if model.value(x[i,j]) > 0.5}
+    return y, get_assign
+
+
+def add_sparse_reschedule(model, req_index_list, ns_start, ns_length, num_items, item_exp_release_time, t, T):
+    # Same problem and return values as add_dense_reschedule, with rows only where requests conflict. The big-M pair
+    # rows bind only for overlapping nominal windows [start, start+length), so the conflicts form an interval graph
+    # whose maximal cliques are the requests open at a start time. Items with equal release time are interchangeable
+    # and aggregated into one class (removes the item symmetry): x[r,j] puts j in class r, and a clique may send at
+    # most the class size to one class, which is exact for interval graphs. Items of a class are handed out after
+    # the solve by start time.
+    release_classes = {} # release time: items
+    for i in range(num_items):
+        release_classes.setdefault(item_exp_release_time[i], []).append(i)
+    reqs = sorted((j for j in req_index_list if ns_start[j] >= t), key=lambda j: ns_start[j]) # y[j] == 0 before t
+
+    x = {(r, j): model.add_var(vtype=BINARY) for j in reqs for r in release_classes if r <= ns_start[j]}
+    y = {j: quicksum(x[r, j] for r in release_classes if (r, j) in x) for j in req_index_list}
+    for j in reqs:
+        model.add_constr(y[j] <= 1)
+
+    starts = sorted(set(ns_start[j] for j in reqs))
+    for n, s in enumerate(starts):
+        clique = [j for j in reqs if ns_start[j] <= s < ns_start[j] + ns_length[j]]
+        # the clique at the next start contains this one unless a request ends in between
+        if n + 1 < len(starts) and min(ns_start[j] + ns_length[j] for j in clique) > starts[n+1]:
+            continue
+        for r, items in release_classes.items():
+            members = [j for j in clique if (r, j) in x]
+            if len(members) > len(items):
+                model.add_constr(quicksum(x[r, j] for j in members) <= len(items))
+
+    def get_assign():
+        updated_assign = {}
+        for r, items in release_classes.items():
+            item_free_time = {i: r for i in items}
+            for j in reqs: # by start time
+                if (r, j) in x and model.value(x[r, j]) > 0.5:
+                    i = next(i for i in items if item_free_time[i] <= ns_start[j])
+                    updated_assign[j] = i
+                    item_free_time[i] = ns_start[j] + ns_length[j]
+        return updated_assign
+    return y, get_assign
+
+
+def sweep_complete_reschedule(req_index_list, ns_start, ns_length, num_items, item_exp_release_time, t, T, telemetry=None, kind="reschedule"):
+    # Same problem and return values as model_complete_reschedule, solved without a MIP. Two requests on one item
+    # must not overlap ([start, start+length) intervals), an item takes a request only after its release time, and
+    # requests starting before t are dropped. Maximizing the number of scheduled intervals on items with release
+    # times is solved exactly by the sweep in end time order, giving each request the in-stock item that became
+    # free the latest (best fit); requests with no free item are left out.
+    solve_start = time.time()
+    free_items = sorted((item_exp_release_time[i], i) for i in range(num_items)) # (free from time, item)
+    updated_assign = {}
+    for j in sorted(req_index_list, key=lambda j: (ns_start[j] + ns_length[j], ns_start[j])):
+        if ns_start[j] < t:
+            continue
+        pos = bisect_right(free_items, (ns_start[j], num_items)) # items free by ns_start[j]
+        if pos == 0:
+            continue
+        free_from, i = free_items.pop(pos - 1)
+        updated_assign[j] = i
+        insort(free_items, (ns_start[j] + ns_length[j], i))
+    if telemetry is not None:
+        telemetry.record(kind, "sweep", None, 0, 0, 0.0, time.time() - solve_start, 0.0, 0, 0.0, OPTIMAL, "optimal")
+    return len(updated_assign), updated_assign
+
+
+class PersistentRescheduleModel:
+    # The complete reschedule model above, kept alive across admissions and delays (owned by a NominalSchedule):
+    # a new request only adds its own variables, its release-time constraints and its pairwise constraints with the
+    # requests already on the model; committed, failed or rejected requests are removed again. Needs gurobipy
+    # (in-place model updates and MIP starts), imported here so that runs without it never load it.
+    # time_limit and telemetry as for model_complete_reschedule.
+    def __init__(self, num_items, item_exp_release_time, T, time_limit=None, telemetry=None):
+        import gurobipy as grb
+        from gurobipy import GRB
+
+        self.Q = 5 * T
+        self.item_list = list(range(num_items))
+        self.item_exp_release_time = dict(item_exp_release_time)
+
+        self.model = grb.Model("complete reschedule (persistent)")
+        self.model.setParam('OutputFlag', 0)
+        self.model.ModelSense = GRB.MAXIMIZE # objective: sum of y[j], set through each y's obj coefficient
+        if time_limit is not None:
+            self.model.setParam('TimeLimit', time_limit)
+        self.telemetry = telemetry
+        self.build_time = 0.0 # model updates since the last solve
+        self.ns_start = {}
+        self.ns_length = {}
+        self.y = {}
+        self.x = {} # (i, j): var
+        self.assign_constrs = {} # j: sum_i x[i,j] == y[j]
+        self.release_constrs = {} # (i, j): release time constr, RHS follows item_exp_release_time[i]
+        self.pair_constrs = {} # (j, k) with j < k: the 4 * num_items big-M constrs between j and k
+        self.partners = {} # j: requests k sharing pair constrs with j
+
+    def add_request(self, j, start, length):
+        import gurobipy as grb
+        from gurobipy import GRB
+
+        build_start = time.time()
+        Q = self.Q
+        model = self.model
+        self.ns_start[j] = start
+        self.ns_length[j] = length
+        self.y[j] = model.addVar(vtype=GRB.BINARY, obj=1, name='yj[%d]' % j)
+        for i in self.item_list:
+            self.x[i, j] = model.addVar(vtype=GRB.BINARY, name='xij[%d,%d]' % (i, j))
+        self.assign_constrs[j] = model.addConstr(grb.quicksum(self.x[i, j] for i in self.item_list) == self.y[j])
+        # item_exp_release_time[i] - (1 - x[i,j])*Q <= ns_start[j], with the data moved to the RHS
+        for i in self.item_list:
+            self.release_constrs[i, j] = model.addConstr(Q * self.x[i, j] <= start - self.item_exp_release_time[i] + Q)
+
+        self.partners[j] = set()
+        for k in self.partners:
+            if k == j:
+                continue
+            constrs = []
+            for a, b in ((j, k), (k, j)):
+                L_ab = 1 if self.ns_start[a] <= self.ns_start[b] else 0
+                R_ab = 1 if self.ns_start[a] + self.ns_length[a] <= self.ns_start[b] + self.ns_length[b] else 0
+                for i in self.item_list:
+                    for M_ab in (L_ab, R_ab):
+                        constrs.append(model.addConstr(self.ns_length[a] - (1 - M_ab)*Q - (2 - self.x[i, a] - self.x[i, b])*Q
+                                                       <= self.ns_start[b] - self.ns_start[a]))
+            self.pair_constrs[min(j, k), max(j, k)] = constrs
+            self.partners[j].add(k)
+            self.partners[k].add(j)
+        self.build_time += time.time() - build_start
+
+    def remove_request(self, j):
+        model = self.model
+        for k in self.partners.pop(j):
+            model.remove(self.pair_constrs.pop((min(j, k), max(j, k))))
+            self.partners[k].discard(j)
+        model.remove(self.assign_constrs.pop(j))
+        for i in self.item_list:
+            model.remove(self.release_constrs.pop((i, j)))
+            model.remove(self.x.pop((i, j)))
+        model.remove(self.y.pop(j))
+        self.ns_start.pop(j)
+        self.ns_length.pop(j)
+
+    def set_release_time(self, i, release_time):
+        self.item_exp_release_time[i] = release_time
+        for j in self.y:
+            self.release_constrs[i, j].RHS = self.ns_start[j] - release_time + self.Q
+
+    def solve(self, t, warm_assign, kind="reschedule"):
+        from gurobipy import GRB
+
+        # auxiliary constr: every nominal schedule should start after current time
+        for j, y in self.y.items():
+            y.UB = 0 if self.ns_start[j] < t else 1
+        # previous nominal schedule as the warm start (requests not in it are left to the solver)
+        for j, y in self.y.items():
+            if j in warm_assign:
+                y.Start = 1
+                for i in self.item_list:
+                    self.x[i, j].Start = 1 if warm_assign[j] == i else 0
+            else:
+                y.Start = GRB.UNDEFINED
+                for i in self.item_list:
+                    self.x[i, j].Start = GRB.UNDEFINED
+
+        model = self.model
+        model.optimize()
+        record_solve_time('gurobi', model.Runtime)
+        fallback_time = 0.0
+        if model.status == GRB.OPTIMAL:
+            outcome = "optimal"
+            obj_val, updated_assign = model.objVal, {j: i for (i, j), x in self.x.items() if x.X > 0.5}
+        elif model.status == GRB.TIME_LIMIT:
+            fallback_start = time.time()
+            outcome = "greedy"
+            obj_val, updated_assign = sweep_complete_reschedule(list(self.y), self.ns_start, self.ns_length, len(self.item_list),
+                                                                self.item_exp_release_time, t, self.Q // 5)
+            if model.SolCount > 0 and model.objVal >= obj_val:
+                outcome = "incumbent"
+                obj_val, updated_assign = model.objVal, {j: i for (i, j), x in self.x.items() if x.X > 0.5}
+            fallback_time = time.time() - fallback_start
+        else:
+            print("Model is either infeasible or unbounded. DEBUG!")
+            outcome = "failed"
+            obj_val, updated_assign = 0, {}
 
+        if self.telemetry is not None:
+            status = {GRB.OPTIMAL: OPTIMAL, GRB.TIME_LIMIT: TIME_LIMIT}.get(model.status, NOT_SOLVED)
+            mip_gap = model.MIPGap if model.SolCount > 0 else None
+            self.telemetry.record(kind, "persistent", "gurobi", model.NumVars, model.NumConstrs, self.build_time, model.Runtime,
+                                  fallback_time, int(model.NodeCount), mip_gap, status, outcome)
+        self.build_time = 0.0
+        return obj_val, updated_assign
@@ -0,0 +1,313 @@
+# Solver independent linear model layer for the reschedule and bound models: build once, solve with gurobi,
+# highs (scipy.optimize.milp) or cpsat (OR-Tools)
+
+import time
+import math
+import itertools
+import importlib.util
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import milp, Bounds, LinearConstraint
+
+BACKENDS = ['gurobi', 'highs', 'cpsat']
+
+MAXIMIZE = -1
+MINIMIZE = 1
+BINARY, INTEGER, CONTINUOUS = 'B', 'I', 'C'
+
+# common status for every backend
+OPTIMAL = 'optimal'
+INFEASIBLE = 'infeasible'
+UNBOUNDED = 'unbounded'
+TIME_LIMIT = 'time_limit' # stopped by the time limit, a solution may still be available
+NOT_SOLVED = 'not_solved'
+
+CPSAT_INF_BOUND = 10**9 # cpsat needs finite domains, used for unbounded integer variables
+
+def default_backend():
+    # gurobi when installed (no import here, FOFS/EDD runs never load it), otherwise highs which needs no license
+    return 'gurobi' if importlib.util.find_spec('gurobipy') is not None else 'highs'
+
+# solve-time statistics per backend: {backend: {'calls', 'total_time', 'max_time'}}
+solve_stats = {}
+
+def record_solve_time(backend, runtime):
+    stats = solve_stats.setdefault(backend, {'calls': 0, 'total_time': 0.0, 'max_time': 0.0})
+    stats['calls'] += 1
+    stats['total_time'] += runtime
+    stats['max_time'] = max(stats['max_time'], runtime)
+
+def report_solve_stats():
+    stats_df = pd.DataFrame.from_dict(solve_stats, orient='index', columns=['calls', 'total_time', 'max_time'])
+    stats_df['avg_time'] = stats_df['total_time'] / stats_df['calls']
+    return stats_df
+
+def reset_solve_stats():
+    solve_stats.clear()
+
+def merge_solve_stats(stats): # e.g. solve_stats sent back from a worker process
+    for backend, other in stats.items():
+        merged = solve_stats.setdefault(backend, {'calls': 0, 'total_time': 0.0, 'max_time': 0.0})
+        merged['calls'] += other['calls']
+        merged['total_time'] += other['total_time']
+        merged['max_time'] = max(merged['max_time'], other['max_time'])
+
+
+class LinExpr:
+    # sum of coeff * var (keyed by the var's column index) plus a constant
+    __slots__ = ('coeffs', 'const')
+    __array_ufunc__ = None # numpy scalars on the left defer to the reflected operators below
+
+    def __init__(self, coeffs=None, const=0.0):
+        self.coeffs = coeffs if coeffs is not None else {}
+        self.const = const
+
+    def copy(self):
+        return LinExpr(dict(self.coeffs), self.const)
+
+    def add_in_place(self, other, sign=1):
+        if isinstance(other, LinExpr):
+            for col, coef in other.coeffs.items():
+                self.coeffs[col] = self.coeffs.get(col, 0) + sign * coef
+            self.const += sign * other.const
+        else:
+            self.const += sign * other
+        return self
+
+    def __add__(self, other):
+        return self.copy().add_in_place(other)
+
+    def __radd__(self, other):
+        return self.copy().add_in_place(other)
+
+    def __sub__(self, other):
+        return self.copy().add_in_place(other, -1)
+
+    def __rsub__(self, other):
+        return (-self).add_in_place(other)
+
+    def __mul__(self, other):
+        if isinstance(other, LinExpr):
+            raise TypeError("only linear expressions are supported")
+        return LinExpr({col: coef * other for col, coef in self.coeffs.items()}, self.const * other)
+
+    __rmul__ = __mul__
+
+    def __neg__(self):
+        return self * -1
+
+    def __le__(self, other):
+        return Constr(self - other, '<')
+
+    def __ge__(self, other):
+        return Constr(self - other, '>')
+
+    def __eq__(self, other):
+        return Constr(self - other, '=')
+
+    __hash__ = None
+
+
+class Var(LinExpr):
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        super().__init__({index: 1.0})
+        self.index = index
+
+
+class Constr:
+    # expr (sense) 0, stored as row coeffs (sense) rhs
+    __slots__ = ('coeffs', 'sense', 'rhs')
+
+    def __init__(self, expr, sense):
+        self.coeffs = expr.coeffs
+        self.sense = sense
+        self.rhs = -expr.const
+
+
+def quicksum(exprs):
+    total = LinExpr()
+    for expr in exprs:
+        total.add_in_place(expr)
+    return total
+
+
+class OptModel:
+    def __init__(self, name="", backend=None, time_limit=None, output_flag=0):
+        self.name = name
+        self.backend = backend if backend is not None else default_backend()
+        if self.backend not in BACKENDS:
+            raise ValueError("unknown solver backend %s, use one of %s" % (self.backend, BACKENDS))
+        self.time_limit = time_limit
+        self.output_flag = output_flag # solver log
+
+        self.lb = []
+        self.ub = []
+        self.vtypes = []
+        self.rows = [] # Constr
+        self.row_names = {}
+        self.objective = LinExpr()
+        self.sense = MAXIMIZE
+
+        self.status = NOT_SOLVED
+        self.obj_val = None
+        self.values = None
+        self.runtime = 0.0
+        self.node_count = 0 # branch-and-bound nodes (branches for cpsat)
+        self.mip_gap = None # relative gap of the returned solution, None without one
+
+    def add_var(self, lb=0.0, ub=math.inf, vtype=CONTINUOUS):
+        if vtype == BINARY:
+            lb, ub = max(lb, 0), min(ub, 1)
+        self.lb.append(lb)
+        self.ub.append(ub)
+        self.vtypes.append(vtype)
+        return Var(len(self.lb) - 1)
+
+    def add_vars(self, *index_lists, lb=0.0, ub=math.inf, vtype=CONTINUOUS):
+        # keyed as gurobi's addVars: key for one index list, tuple of keys for several
+        keys = index_lists[0] if len(index_lists) == 1 else itertools.product(*index_lists)
+        return {key: self.add_var(lb, ub, vtype) for key in keys}
+
+    def add_constr(self, constr, name=None):
+        if name is not None:
+            self.row_names[name] = len(self.rows)
+        self.rows.append(constr)
+
+    def add_constrs(self, constrs, name=None):
+        # named name[0], name[1], ... in generation order
+        for n, constr in enumerate(constrs):
+            self.add_constr(constr, None if name is None else '%s[%d]' % (name, n))
+
+    def set_objective(self, expr, sense=MAXIMIZE):
+        self.objective = expr if isinstance(expr, LinExpr) else LinExpr(const=expr)
+        self.sense = sense
+
+    def to_matrix(self):
+        rows, cols, vals = [], [], []
+        for r, constr in enumerate(self.rows):
+            rows.extend([r] * len(constr.coeffs))
+            cols.extend(constr.coeffs.keys())
+            vals.extend(constr.coeffs.values())
+        A = sparse.csr_matrix((vals, (rows, cols)), shape=(len(self.rows), len(self.lb)))
+        senses = np.array([constr.sense for constr in self.rows], dtype='U1')
+        rhs = np.array([constr.rhs for constr in self.rows], dtype=float)
+        c = np.zeros(len(self.lb))
+        for col, coef in self.objective.coeffs.items():
+            c[col] += coef
+        return A, senses, rhs, c
+
+    def optimize(self):
+        A, senses, rhs, c = self.to_matrix()
+        start_time = time.time()
+        if not self.lb: # nothing to decide, rows are constants (scipy's milp rejects empty models)
+            feasible = np.all(np.where(senses == '<', rhs >= 0, np.where(senses == '>', rhs <= 0, rhs == 0)))
+            self.status, values, obj_val = (OPTIMAL, np.zeros(0), 0.0) if feasible else (INFEASIBLE, None, None)
+            self.mip_gap = 0.0 if feasible else None
+        elif self.backend == 'gurobi':
+            self.status, values, obj_val = self.__solve_gurobi(A, senses, rhs, c)
+        elif self.backend == 'highs':
+            self.status, values, obj_val = self.__solve_highs(A, senses, rhs, c)
+        else:
+            self.status, values, obj_val = self.__solve_cpsat(A, senses, rhs, c)
+        self.runtime = time.time() - start_time
+        record_solve_time(self.backend, self.runtime)
+
+        self.values = values
+        self.obj_val = obj_val + self.objective.const if obj_val is not None else None
+        return self.status
+
+    def value(self, var):
+        return self.values[var.index]
+
+    def slack(self, name):
+        # rhs - lhs for <=, lhs - rhs for >=, 0 for ==
+        constr = self.rows[self.row_names[name]]
+        lhs = sum(coef * self.values[col] for col, coef in constr.coeffs.items())
+        return constr.rhs - lhs if constr.sense == '<' else lhs - constr.rhs if constr.sense == '>' else 0.0
+
+    def __solve_gurobi(self, A, senses, rhs, c):
+        import gurobipy as grb
+        from gurobipy import GRB
+
+        model = grb.Model(self.name)
+        model.setParam('OutputFlag', self.output_flag)
+        if self.time_limit is not None:
+            model.setParam('TimeLimit', self.time_limit)
+        x = model.addMVar(len(self.lb), lb=np.array(self.lb), ub=np.array(self.ub), vtype=np.array(self.vtypes))
+        if len(self.rows):
+            model.addMConstr(A, x, senses, rhs)
+        model.setMObjective(None, c, 0.0, sense=GRB.MAXIMIZE if self.sense == MAXIMIZE else GRB.MINIMIZE)
+        model.optimize()
+
+        status = {GRB.OPTIMAL: OPTIMAL, GRB.INFEASIBLE: INFEASIBLE, GRB.INF_OR_UNBD: INFEASIBLE,
+                  GRB.UNBOUNDED: UNBOUNDED, GRB.TIME_LIMIT: TIME_LIMIT}.get(model.status, NOT_SOLVED)
+        self.node_count = int(model.NodeCount) if model.IsMIP else 0
+        if model.SolCount > 0:
+            self.mip_gap = model.MIPGap if model.IsMIP else 0.0
+            return status, x.X, model.objVal
+        return status, None, None
+
+    def __solve_highs(self, A, senses, rhs, c):
+        lo = np.where(senses == '<', -np.inf, rhs)
+        hi = np.where(senses == '>', np.inf, rhs)
+        constraints = LinearConstraint(A, lo, hi) if len(self.rows) else ()
+        options = {'disp': bool(self.output_flag)}
+        if self.time_limit is not None:
+            options['time_limit'] = self.time_limit
+        res = milp(c * self.sense, integrality=(np.array(self.vtypes) != CONTINUOUS).astype(int),
+                   bounds=Bounds(np.array(self.lb), np.array(self.ub)), constraints=constraints, options=options)
+
+        status = {0: OPTIMAL, 1: TIME_LIMIT, 2: INFEASIBLE, 3: UNBOUNDED}.get(res.status, NOT_SOLVED)
+        self.node_count = int(getattr(res, 'mip_node_count', 0) or 0)
+        if res.x is not None:
+            self.mip_gap = getattr(res, 'mip_gap', 0.0)
+            return status, res.x, res.fun * self.sense
+        return status, None, None
+
+    def __solve_cpsat(self, A, senses, rhs, c):
+        try:
+            from ortools.sat.python import cp_model
+        except ImportError:
+            raise ImportError("ortools is required for the cpsat backend, use gurobi or highs instead")
+        if CONTINUOUS in self.vtypes:
+            raise ValueError("cpsat solves integer models only (no continuous variables or LP relaxation)")
+        if np.any(A.data != np.round(A.data)) or np.any(c != np.round(c)):
+            raise ValueError("cpsat needs integer coefficients")
+        if np.any(rhs != np.round(rhs)):
+            raise ValueError("cpsat needs integer right-hand sides")
+
+        model = cp_model.CpModel()
+        x = [model.NewIntVar(int(max(lb, -CPSAT_INF_BOUND)), int(min(ub, CPSAT_INF_BOUND)), '')
+             for lb, ub in zip(self.lb, self.ub)]
+        for r in range(A.shape[0]):
+            row = A.getrow(r)
+            expr = cp_model.LinearExpr.WeightedSum([x[col] for col in row.indices], [int(round(v)) for v in row.data])
+            if senses[r] == '<':
+                model.Add(expr <= int(round(rhs[r])))
+            elif senses[r] == '>':
+                model.Add(expr >= int(round(rhs[r])))
+            else:
+                model.Add(expr == int(round(rhs[r])))
+        objective = cp_model.LinearExpr.WeightedSum(x, [int(round(v)) for v in c])
+        if self.sense == MAXIMIZE:
+            model.Maximize(objective)
+        else:
+            model.Minimize(objective)
+
+        solver = cp_model.CpSolver()
+        solver.parameters.log_search_progress = bool(self.output_flag)
+        if self.time_limit is not None:
+            solver.parameters.max_time_in_seconds = self.time_limit
+        cp_status = solver.Solve(model)
+
+        status = {cp_model.OPTIMAL: OPTIMAL, cp_model.INFEASIBLE: INFEASIBLE,
+                  cp_model.FEASIBLE: TIME_LIMIT}.get(cp_status, NOT_SOLVED)
+        self.node_count = int(solver.NumBranches())
+        if cp_status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            obj_val = solver.ObjectiveValue()
+            self.mip_gap = abs(solver.BestObjectiveBound() - obj_val) / max(abs(obj_val), 1e-10)
+            return status, np.array([solver.Value(v) for v in x], dtype=float), obj_val
+        return status, None, None
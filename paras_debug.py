@@ -9,7 +9,12 @@ parameters_config = {
 
     "exp_stage": "DEFAULT_DEBUG",
 
-    "export_data_dir": "upper_bounds/data/"
+    "export_data_dir": "upper_bounds/data/",
+
+    "trace_file": None, #write a structured event trace here (see trace_recorder.py); None to disable
+    "trace_events": ['return', 'admit', 'reject', 'commit', 'finish', 'fail', 'reschedule'],
+    "trace_format": 'binary', #binary (numpy only) or parquet (needs pyarrow)
+    "report_file": None, #REPORT text of enable_output_file runs goes here; None for stdout
 }
 
 parameters_main = {
@@ -19,6 +24,10 @@ parameters_main = {
     "starting_inv": 5,
     "inf_inv": 100,
 
+    "inventory_engine": "object", #object (one ProductItem per unit) or array (NumPy arrays, for large catalogs)
+    "time_advance": "tick", #tick (every period) or event (skip periods with no arrival, return or due order)
+
+    "random_streams": "legacy", #legacy (one stream, reproduces old results) or spawn (SeedSequence substreams per component)
     "is_seed": 1,
     "rand_seed": 8,
 }
@@ -31,6 +40,14 @@ parameters_dist = {
     "cycle_duration_lognormal_sigma": 0.5073,
 
     "NomiSch_realtime_delay_grace_period": 3, #TODO: experiment goes here
+    "NomiSch_reschedule_model": "rebuild", #rebuild (new MIP per solve), persistent (one MIP updated in place) or sweep (no MIP)
+    "NomiSch_solver_backend": None, #gurobi, highs or cpsat for the rebuild MIP (None: gurobi when installed, else highs)
+    "NomiSch_formulation": "dense", #dense (big-M rows for every item and pair) or sparse (conflict cliques, items aggregated by release time)
+    "NomiSch_delay_scope": "full", #full (re-solve every request on a delay) or component (only the delayed item's conflict component)
+    "NomiSch_batch_admission": None, #None (one solve per arrival), or one solve per period: prefix, fifo or edd (see NominalSchedule.reschedule_for_new_requests_batch)
+    "NomiSch_time_limit": None, #seconds per schedule solve, None: to optimality. On timeout the better of incumbent and greedy is used
+    "NomiSch_solve_cache_size": 0, #LRU entries for cached complete reschedules (0: no cache), see ScheduleSolveCache
+    "NomiSch_solve_cache_file": None, #pickle file the cache is saved to and loaded from (None: memory only)
 
     # "regular_return_periods": 37,
     # "return_no_delay_proportion": 0.5,
@@ -6,36 +6,57 @@ import math
 import numpy as np
 import matplotlib.pyplot as plot
 
-def uniform_discrete_one(lb, ub): #note, ub cant be attained!
-    return np.random.randint(low=lb, high=ub)
+# rng: where the draws come from. np.random (the global state, default), a np.random.RandomState,
+# or a np.random.Generator; RandomState and the global state give the same draws for the same seed
 
-def poisson_arr_discrete_seq(time_limits, lmbd):
-    arr_seq = []
-    sum = (-np.log(np.random.rand())/lmbd)
-    while round(sum) < time_limits:
-        arr_seq.append(round(sum))
-        exp_var = (-np.log(np.random.rand())/lmbd)
-        sum = sum + exp_var
-    return arr_seq
+def uniform_discrete_one(lb, ub, rng=np.random): #note, ub cant be attained!
+    if isinstance(rng, np.random.Generator):
+        return rng.integers(low=lb, high=ub)
+    return rng.randint(low=lb, high=ub)
 
-def binomial_discrete_seq(length, n, p):
-    return np.random.binomial(n, p, length)
+def poisson_arr_discrete_seq(time_limits, lmbd, rng=np.random, legacy_order=True):
+    # legacy_order: one draw at a time, exactly as many draws as the old results used.
+    # otherwise the exponential gaps are drawn in blocks (a bit more than the expected count) and cumsum-ed;
+    # same arrival times for the same draws, but the leftover draws of the last block are spent
+    if legacy_order:
+        arr_seq = []
+        sum = (-np.log(rng.random())/lmbd)
+        while round(sum) < time_limits:
+            arr_seq.append(round(sum))
+            exp_var = (-np.log(rng.random())/lmbd)
+            sum = sum + exp_var
+        return arr_seq
+
+    mean_cnt = lmbd * time_limits
+    block_size = int(mean_cnt + 4 * math.sqrt(mean_cnt)) + 16
+    sum_blocks = []
+    sum = 0.0
+    while True:
+        exp_var = -np.log(rng.random(block_size))/lmbd
+        block = np.cumsum(np.concatenate(([sum], exp_var)))[1:] # running sum carried over, added in the same order as the loop
+        sum_blocks.append(block)
+        sum = block[-1]
+        if round(sum) >= time_limits:
+            break
+    arr_seq = np.round(np.concatenate(sum_blocks)) # np.round rounds half to even, like round
+    return arr_seq[:np.searchsorted(arr_seq, time_limits)].astype(np.int64).tolist()
+
+def binomial_discrete_seq(length, n, p, rng=np.random):
+    return rng.binomial(n, p, length)
 
 # (9/6)
-def lognormal_rounded_up_seq(length, mu, sigma):
-    arr_seq = np.random.lognormal(mean=mu, sigma=sigma, size=length)
+def lognormal_rounded_up_seq(length, mu, sigma, rng=np.random):
+    arr_seq = rng.lognormal(mean=mu, sigma=sigma, size=length)
     return np.ceil(arr_seq)
 
-def geom_discrete_seq(length, mean):
+def geom_discrete_seq(length, mean, rng=np.random):
     p = 1/(mean+1)
-    return np.random.geometric(p, length)-1
-
-def mixed_geom_discrete_seq(length, mean, no_delay_proportion):
-    seq = geom_discrete_seq(length, mean)
-    unif_seq = np.random.rand(length)
-    for i in range(length):
-        if unif_seq[i] <= no_delay_proportion:
-            seq[i] = 0
+    return rng.geometric(p, length)-1
+
+def mixed_geom_discrete_seq(length, mean, no_delay_proportion, rng=np.random):
+    seq = geom_discrete_seq(length, mean, rng)
+    unif_seq = rng.random(length)
+    seq[unif_seq <= no_delay_proportion] = 0
     return seq
 
 # # TEST BELOW
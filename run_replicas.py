@@ -3,18 +3,15 @@
 # 2022/05/04
 
 from simulator_main import MainSimulator
+from simulator_batch import BatchSimulator
+from model_reschedule import LATENCY_BIN_EDGES
 from paras_debug import *
 
 import sys, os
+import copy
 import argparse
 import pandas as pd
-
-parser = argparse.ArgumentParser(add_help=False)
-# parser.add_argument('--rseed', type=int)
-parser.add_argument('--allconfig', type=int)
-parser.add_argument('--stage', type=str)
-args = parser.parse_args()
-# rand_seed = args.rseed
+from concurrent.futures import ProcessPoolExecutor
 
 # disp_pol = ['current', 'future', 'future_cstp']
 # adm_pol = ['IT0', 'ITInf']
@@ -59,80 +56,133 @@ EDD_leadtime = [1] #redundant
 
 diagnosis_story = 0
 enable_output_file = 0
+enable_trace = 0 #structured event trace per case, written to output/*.trace
+trace_format = 'binary' #binary or parquet (needs pyarrow)
 
 
 
 
 rseeds = list(range(1, 51)) #50 replications in simulation
 
-exp_stage = args.stage
-parameters_config.update({'exp_stage': exp_stage})
-is_all_config = args.allconfig
-
-res_pct_list = []
-for pct in cycle_duration_lognormal_percentile_list:
-    parameters_dist.update({'cycle_duration_lognormal_percentile': pct})
-    for rand_seed in rseeds:
-        parameters_main.update({'rand_seed': rand_seed})
-        parameters_main.update({'diagnosis_story_output': diagnosis_story})
-        parameters_config.update({'enable_output_file': enable_output_file})
-
-        file_name = '_'.join([exp_stage, 'all'+str(is_all_config), 'rseed'+str(rand_seed)])
-        stdout_file_name = file_name + '.txt'
-        stdout_file_name = os.path.join("output", stdout_file_name)
-        if enable_output_file:
-            sys.stdout = open(stdout_file_name, 'w')
-
-        res_list = []
-        res_index_list = []
-        res_cols = ['rseed', 'num_req', 'adm_rate', 'succ_order_rate', 'service_rate']
-
-        for disp in disp_pol:
-            for adm in adm_pol:
-                for alloc in alloc_pol:
-                    parameters_config.update({'display_policy_wrt': disp, 'admission_policy': adm, 'allocation_policy': alloc})
-                    if alloc == 'FOFS' or alloc == 'NomiSch':
-                        simul = MainSimulator(parameters_config, parameters_main, parameters_dist)
-                        simul.initialize()
-                        num_req, adm_rate, succ_order_rate, service_rate, req_stories = simul.run_and_report()
-
-                        index = '-'.join([alloc, adm, disp])
-                        res_index_list.append(index)
-                        res = {'rseed': rand_seed, 'num_req': num_req, 'adm_rate': round(adm_rate,4),
-                                         'succ_order_rate': round(succ_order_rate,4), 'service_rate': round(service_rate, 4)}
-                        res_list.append(res)
-
-                    elif alloc == 'EDD':
-                        for lt in EDD_leadtime:
-                            parameters_config.update({'EDD_lead_time': lt})
-                            simul = MainSimulator(parameters_config, parameters_main, parameters_dist)
-                            simul.initialize()
-                            num_req, adm_rate, succ_order_rate, service_rate, req_stories = simul.run_and_report()
-
-                            index = '-'.join([alloc, str(lt), adm, disp])
-                            res_index_list.append(index)
-                            res = {'rseed': rand_seed, 'num_req': num_req, 'adm_rate': round(adm_rate, 4),
-                                   'succ_order_rate': round(succ_order_rate, 4), 'service_rate': round(service_rate, 4)}
-                            res_list.append(res)
-
-                    # save stories for each rseed, policy combination (one case)
-                    if diagnosis_story == 1:
-                        story_file_name = index + "_" + file_name + ".csv"
-                        story_file_name = os.path.join("diagnosis", story_file_name)
-                        req_stories.to_csv(story_file_name)
-        if enable_output_file:
-            sys.stdout.close()
-
-        # #save result file (for each rseed, all policy in a run)
-        # res_file_name = file_name + '.csv'
-        # res_file_name = os.path.join("result", res_file_name)
-        # res_df = pd.DataFrame(res_list, index=res_index_list)
-        # res_df.to_csv(res_file_name)
-
-        res.update({"policy": policy_comp, "pct": pct})
-        res_pct_list.append(res)
-
-# save all file (for each policy)
-policy_res_file = os.path.join("result" , "policy_comp", exp_stage + "_" + policy_comp + ".csv")
-res_pct_df = pd.DataFrame(res_pct_list)
-res_pct_df.to_csv(policy_res_file)
\ No newline at end of file
+def build_cases(exp_stage, is_all_config):
+    # one case per (percentile, seed, policy combination), in the order of the original serial loops;
+    # every case carries its own copy of the parameter dicts, so nothing shared is changed in place
+    cases = []
+    for pct in cycle_duration_lognormal_percentile_list:
+        for rand_seed in rseeds:
+            file_name = '_'.join([exp_stage, 'all'+str(is_all_config), 'rseed'+str(rand_seed)])
+            for disp in disp_pol:
+                for adm in adm_pol:
+                    for alloc in alloc_pol:
+                        if alloc == 'FOFS' or alloc == 'NomiSch':
+                            lt_list = [None]
+                        elif alloc == 'EDD':
+                            lt_list = EDD_leadtime
+                        else:
+                            continue
+                        for lt in lt_list:
+                            paras_config = copy.deepcopy(parameters_config)
+                            paras_main = copy.deepcopy(parameters_main)
+                            paras_dist = copy.deepcopy(parameters_dist)
+                            paras_config.update({'exp_stage': exp_stage, 'enable_output_file': enable_output_file,
+                                                 'display_policy_wrt': disp, 'admission_policy': adm, 'allocation_policy': alloc})
+                            paras_main.update({'rand_seed': rand_seed, 'diagnosis_story_output': diagnosis_story})
+                            paras_dist.update({'cycle_duration_lognormal_percentile': pct})
+                            if lt is None:
+                                index = '-'.join([alloc, adm, disp])
+                            else:
+                                paras_config.update({'EDD_lead_time': lt})
+                                index = '-'.join([alloc, str(lt), adm, disp])
+                            if enable_trace:
+                                trace_file_name = '_'.join([file_name, 'pct'+str(pct), index]) + '.trace'
+                                paras_config.update({'trace_file': os.path.join("output", trace_file_name), 'trace_format': trace_format})
+                            if enable_output_file:
+                                report_file_name = '_'.join([file_name, 'pct'+str(pct), index]) + '.txt'
+                                paras_config.update({'report_file': os.path.join("output", report_file_name)})
+                            cases.append({'pct': pct, 'rand_seed': rand_seed, 'index': index, 'file_name': file_name,
+                                          'paras': (paras_config, paras_main, paras_dist)})
+    return cases
+
+def run_case(case):
+    # runs in a worker process; the simulator seeds itself from its own parameter copy
+    paras_config, paras_main, paras_dist = case['paras']
+    simul = MainSimulator(paras_config, paras_main, paras_dist)
+    simul.initialize()
+    num_req, adm_rate, succ_order_rate, service_rate, req_stories = simul.run_and_report()
+
+    # save stories for each rseed, policy combination (one case)
+    if diagnosis_story == 1:
+        story_file_name = case['index'] + "_" + case['file_name'] + ".csv"
+        story_file_name = os.path.join("diagnosis", story_file_name)
+        req_stories.to_csv(story_file_name)
+
+    res = {'rseed': case['rand_seed'], 'num_req': num_req, 'adm_rate': round(adm_rate, 4),
+           'succ_order_rate': round(succ_order_rate, 4), 'service_rate': round(service_rate, 4)}
+    # schedule solve latency (NomiSch): p99 and a histogram, one column per bin (upper edge in seconds)
+    if simul.solve_telemetry.rows:
+        res['solve_latency_p99'] = simul.solve_telemetry.latency_percentile(99)
+        res['solve_cache_hits'] = sum(row['outcome'] == "cached" for row in simul.solve_telemetry.rows)
+        for edge, cnt in zip(LATENCY_BIN_EDGES[1:], simul.solve_telemetry.latency_histogram()):
+            res['solve_latency_le_%g' % edge] = int(cnt)
+    return res
+
+def run_seed_batch(cases):
+    # cases that differ only in rand_seed, run as one BatchSimulator (non-MIP policies, no stories/stdout files)
+    paras_config, paras_main, paras_dist = cases[0]['paras']
+    simul = BatchSimulator(paras_config, paras_main, paras_dist, [case['rand_seed'] for case in cases])
+    simul.initialize()
+    num_req, adm_rate, succ_order_rate, service_rate = simul.run_and_report()
+    return [{'rseed': case['rand_seed'], 'num_req': int(num_req[r]), 'adm_rate': round(float(adm_rate[r]), 4),
+             'succ_order_rate': round(float(succ_order_rate[r]), 4), 'service_rate': round(float(service_rate[r]), 4)}
+            for r, case in enumerate(cases)]
+
+def group_cases_by_seed(cases):
+    # positions of the cases sharing (pct, policy), in rseed order
+    groups = {}
+    for pos, case in enumerate(cases):
+        groups.setdefault((case['pct'], case['index']), []).append(pos)
+    return list(groups.values())
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(add_help=False)
+    # parser.add_argument('--rseed', type=int)
+    parser.add_argument('--allconfig', type=int)
+    parser.add_argument('--stage', type=str)
+    parser.add_argument('--workers', type=int, default=1) #>1 runs the cases in a process pool
+    parser.add_argument('--batch', type=int, default=0) #1 runs all seeds of a (pct, policy) as one BatchSimulator
+    args = parser.parse_args()
+
+    exp_stage = args.stage
+    is_all_config = args.allconfig
+
+    cases = build_cases(exp_stage, is_all_config)
+    use_batch = args.batch == 1 and "NomiSch" not in alloc_pol and diagnosis_story == 0 and enable_output_file == 0
+    if use_batch:
+        groups = group_cases_by_seed(cases)
+        group_cases = [[cases[pos] for pos in group] for group in groups]
+        if args.workers > 1:
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                group_res_list = list(pool.map(run_seed_batch, group_cases))
+        else:
+            group_res_list = [run_seed_batch(gc) for gc in group_cases]
+        res_list = [None] * len(cases)
+        for group, group_res in zip(groups, group_res_list):
+            for pos, res in zip(group, group_res):
+                res_list[pos] = res
+    elif args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            res_list = list(pool.map(run_case, cases)) # results come back in case order, whatever the worker count
+    else:
+        res_list = [run_case(case) for case in cases]
+
+    # keep the last policy result of each (pct, rseed), as the serial loops did
+    res_pct = {}
+    for case, res in zip(cases, res_list):
+        res.update({"policy": policy_comp, "pct": case['pct']})
+        res_pct[case['pct'], case['rand_seed']] = res
+    res_pct_list = list(res_pct.values())
+
+    # save all file (for each policy)
+    policy_res_file = os.path.join("result" , "policy_comp", exp_stage + "_" + policy_comp + ".csv")
+    res_pct_df = pd.DataFrame(res_pct_list)
+    res_pct_df.to_csv(policy_res_file)
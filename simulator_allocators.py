@@ -7,20 +7,20 @@ from simulator_classes import *
 def FOFS_alloc(inventory, orders, length_of_delivery, t, enable_output_file): #EDIT FOFS CODES, SHOULD EDIT EDD TOO
     # REPORT
     if enable_output_file:
-        print("\nAllocation control with FOFS policy")
+        inventory.trace.report("\nAllocation control with FOFS policy")
 
     current_inv = inventory.current_inv
     if current_inv <= 0:
         return [], [], []
 
-    orders = [o for o in orders if o.status == 0 and o.desired_time >= t+length_of_delivery] #all the admitted but not commited orders (+extra validity check)
+    orders = [o for o in orders.orders_with_status(0) if o.desired_time >= t+length_of_delivery] #all the admitted but not commited orders (+extra validity check)
     sorted_orders = sort_order_list_by_t(orders)
     inv_items = inventory.take_inv_items_list()
     # REPORT
     if enable_output_file:
-        print("  current inv: %d"%current_inv)
+        inventory.trace.report("  current inv: %d"%current_inv)
         for od in sorted_orders:
-            print("  uncommited order: %d, order time: %d, desired time: %d"%(od.req_index, od.order_time, od.desired_time))
+            inventory.trace.report("  uncommited order: %d, order time: %d, desired time: %d"%(od.req_index, od.order_time, od.desired_time))
 
     commit_cnt = 0
     num_orders = len(orders)
@@ -43,21 +43,21 @@ def FOFS_alloc(inventory, orders, length_of_delivery, t, enable_output_file): #E
 def EDD_alloc(inventory, orders, length_of_delivery, t, lead_time, enable_output_file):
     # REPORT
     if enable_output_file:
-        print("\nAllocation control with EDD policy, lead time %d" %lead_time)
+        inventory.trace.report("\nAllocation control with EDD policy, lead time %d" %lead_time)
 
     current_inv = inventory.current_inv
     if current_inv <= 0:
         return [], [], []
 
-    orders = [o for o in orders if o.status == 0 and o.desired_time >= t+length_of_delivery] #+extra validity check
+    orders = [o for o in orders.orders_with_status(0) if o.desired_time >= t+length_of_delivery] #+extra validity check
     orders = [o for o in orders if t >= o.desired_time - lead_time]
     sorted_orders = sort_order_list_by_s(orders)
     inv_items = inventory.take_inv_items_list()
     # REPORT
     if enable_output_file:
-        print("  current inv: %d" % current_inv)
+        inventory.trace.report("  current inv: %d" % current_inv)
         for od in sorted_orders:
-            print("  uncommited eligible order: %d, order time: %d, desired time: %d"%(od.req_index, od.order_time, od.desired_time))
+            inventory.trace.report("  uncommited eligible order: %d, order time: %d, desired time: %d"%(od.req_index, od.order_time, od.desired_time))
     commit_cnt = 0
     num_orders = len(orders)
 
@@ -103,15 +103,15 @@ def NS_alloc(inventory, orders, schedule, length_of_delivery, median_cycle_durat
     # update info for committed/failed orders
     od_desired_dates = {} #auxiliary for item info updates
     od_realized_cycle_duration = {} #auxiliary for item info updates
-    for od in orders:
-        if od.req_index in committed_orders:
-            od.commit_order(assign_info[od.req_index], t)
+    for req_index in committed_orders:
+        od = orders.get_order(req_index)
+        od.commit_order(assign_info[req_index], t)
 
-            od_desired_dates.update({od.req_index: od.desired_time})
-            od_realized_cycle_duration.update({od.req_index: od.realized_cycle_duration})
+        od_desired_dates.update({req_index: od.desired_time})
+        od_realized_cycle_duration.update({req_index: od.realized_cycle_duration})
 
-        elif od.req_index in failed_orders:
-            od.fail_order(t)
+    for req_index in failed_orders:
+        orders.get_order(req_index).fail_order(t)
 
     # update info for committed items
     desired_dates = []
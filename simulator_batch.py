@@ -0,0 +1,157 @@
+# Batched simulator: R replicas at once along a replica axis (non-MIP policies only)
+
+import numpy as np
+
+from simulator_main import MainSimulator
+
+NO_ORDER = -9 # order status for requests that never became an order
+
+class BatchSimulator:
+    # Same period logic as MainSimulator.update_one_period for display current/future/future_cstp,
+    # admission IT0/ITInf and allocation FOFS/EDD. Item state is kept as (replica, item) arrays and
+    # request/order state as (replica, request) arrays, so every step runs for all replicas together.
+
+    def __init__(self, paras_config, paras_main, paras_dist, rand_seeds):
+        self.paras = {}
+        self.paras.update(paras_config)
+        self.paras.update(paras_main)
+        self.paras.update(paras_dist)
+        self.paras['enable_output_file'] = 0 # no per-event REPORT output or trace in batch mode
+        self.paras['trace_file'] = None
+
+        self.rand_seeds = list(rand_seeds)
+        self.num_replicas = len(self.rand_seeds)
+
+        self.disp_policy = self.paras['display_policy_wrt']
+        self.admit_policy = self.paras['admission_policy']
+        self.alloc_policy = self.paras['allocation_policy']
+        if self.disp_policy not in ("current", "future", "future_cstp") or self.admit_policy not in ("IT0", "ITInf") \
+                or self.alloc_policy not in ("FOFS", "EDD"):
+            raise ValueError("BatchSimulator does not support policy %s-%s-%s" % (self.alloc_policy, self.admit_policy, self.disp_policy))
+
+    # Build every replica's instance with MainSimulator.initialize (same draws as a single run), then stack them
+    def initialize(self):
+        self.time_horizon = self.paras['time_horizon']
+        self.length_of_delivery = self.paras['length_of_delivery']
+        self.pred_window_cycle_duration = self.paras['cycle_duration_lognormal_percentile']
+        self.EDD_lead_time = self.paras['EDD_lead_time']
+
+        replicas = []
+        for rand_seed in self.rand_seeds:
+            paras = dict(self.paras)
+            paras['rand_seed'] = rand_seed
+            simul = MainSimulator(paras, {}, {})
+            simul.initialize()
+            replicas.append(simul)
+
+        # items
+        self.item_status = np.array([[it.status for it in s.inventory.items] for s in replicas], dtype=np.int8)
+        self.item_rp = np.array([[it.return_periods for it in s.inventory.items] for s in replicas], dtype=np.int64)
+        self.item_errp = np.array([[it.exp_regular_return_periods for it in s.inventory.items] for s in replicas], dtype=np.int64)
+        self.item_cir_cnt = np.array([[it.cir_cnt for it in s.inventory.items] for s in replicas], dtype=np.int64)
+        self.current_inv = np.array([s.inventory.current_inv for s in replicas], dtype=np.int64)
+
+        # requests, padded to the longest replica; padding never arrives (order_time = horizon)
+        self.num_req = np.array([s.num_req for s in replicas], dtype=np.int64)
+        num_cols = max(int(self.num_req.max()), 1)
+        self.req_order_time = np.full((self.num_replicas, num_cols), self.time_horizon, dtype=np.int64)
+        self.req_desired_time = np.full((self.num_replicas, num_cols), self.time_horizon + 1, dtype=np.int64)
+        self.req_realized_cycle_duration = np.zeros((self.num_replicas, num_cols), dtype=np.int64)
+        for r, s in enumerate(replicas):
+            self.req_order_time[r, :s.num_req] = [cr.order_time for cr in s.requests]
+            self.req_desired_time[r, :s.num_req] = [cr.desired_time for cr in s.requests]
+            self.req_realized_cycle_duration[r, :s.num_req] = [cr.realized_cycle_duration for cr in s.requests]
+        self.req_period_start = np.array([np.searchsorted(row, np.arange(self.time_horizon + 1)) for row in self.req_order_time])
+
+        self.req_status = np.zeros((self.num_replicas, num_cols), dtype=np.int8) #0 for new, 1 for admitted, -1 for rejected
+        self.order_status = np.full((self.num_replicas, num_cols), NO_ORDER, dtype=np.int8) #same codes as CustomerOrder.status
+
+    def run_and_report(self):
+        for t in range(self.time_horizon):
+            self.update_one_period(t)
+
+        num_admitted = np.count_nonzero(self.req_status == 1, axis=1)
+        num_succ = np.count_nonzero(self.order_status == 2, axis=1)
+        adm_rate = num_admitted / self.num_req * 100
+        succ_order_rate = num_succ / num_admitted * 100
+        service_rate = num_succ / self.num_req * 100
+
+        print("\nBatch of %d replicas with disp policy: " % self.num_replicas, self.disp_policy, ", admit: ", self.admit_policy, ", alloc: ", self.alloc_policy)
+        print("  avg admission: %.2f %%, avg on-time arrival: %.2f %%, avg service: %.2f %%" % (adm_rate.mean(), succ_order_rate.mean(), service_rate.mean()))
+        return self.num_req, adm_rate, succ_order_rate, service_rate
+
+    def update_one_period(self, t):
+        # receive returning items (item 0 is left out of current_inv, as in Inventory.receive_returns)
+        arrived = (self.item_status == 0) & (self.item_rp == 0)
+        self.item_status[arrived] = 1
+        self.item_errp[arrived] = 0
+        self.current_inv += np.count_nonzero(arrived[:, 1:], axis=1)
+
+        self.admit_requests(t)
+        self.allocate_orders(t)
+
+        # info updates
+        expired = (self.order_status == 0) & (self.req_desired_time <= t + self.length_of_delivery)
+        self.order_status[expired] = -2
+        self.order_status[self.order_status == 1] = 2
+        moving = (self.item_status == 0) & (self.item_rp > 0)
+        self.item_rp -= moving
+        self.item_errp -= moving
+
+    def admit_requests(self, t):
+        # arrivals within a period are handled one at a time (each decision changes the next one),
+        # the j-th arrival of every replica together
+        start = self.req_period_start[:, t]
+        num_arr = self.req_period_start[:, t+1] - start
+        avai_inv = self.current_inv.copy() # for the current display policy
+        for j in range(int(num_arr.max())):
+            rows = np.flatnonzero(j < num_arr)
+            cols = start[rows] + j
+
+            if self.admit_policy == "ITInf":
+                admit = np.ones(len(rows), dtype=bool)
+            elif self.disp_policy == "current":
+                admit = avai_inv[rows] > 0
+                avai_inv[rows[admit]] -= 1
+            else:
+                desired_time = self.req_desired_time[rows, cols][:, None]
+                status = self.item_status[rows]
+                current_inv = np.count_nonzero(status == 1, axis=1)
+                future_exp_return = np.count_nonzero((status == 0) & (t + self.item_errp[rows] <= desired_time), axis=1)
+                # orders admitted earlier in this period for the same date (inv_occup_record)
+                num_occupied_items = np.count_nonzero((self.order_status[rows] != NO_ORDER) & (self.req_order_time[rows] == t)
+                                                      & (self.req_desired_time[rows] == desired_time), axis=1)
+                avai = current_inv + future_exp_return - num_occupied_items
+                if self.disp_policy == "future_cstp":
+                    avai -= np.count_nonzero((self.order_status[rows] == 0) & (self.req_desired_time[rows] < desired_time), axis=1)
+                admit = avai > 0
+
+            self.req_status[rows, cols] = np.where(admit, 1, -1)
+            self.order_status[rows[admit], cols[admit]] = 0
+
+    def allocate_orders(self, t):
+        eligible = (self.order_status == 0) & (self.req_desired_time >= t + self.length_of_delivery)
+        if self.alloc_policy == "EDD":
+            eligible &= t >= self.req_desired_time - self.EDD_lead_time
+        num_commit = np.where(self.current_inv > 0, np.minimum(self.current_inv, np.count_nonzero(eligible, axis=1)), 0)
+        if num_commit.max() <= 0:
+            return
+
+        # stable sorts keep creation order among ties, as sort_order_list_by_t/_by_s do
+        if self.alloc_policy == "FOFS":
+            sorted_orders = np.argsort(~eligible, axis=1, kind='stable') # requests are already in order_time order
+        else:
+            sorted_orders = np.argsort(np.where(eligible, self.req_desired_time, np.iinfo(np.int64).max), axis=1, kind='stable')
+        inv_items = np.argsort(self.item_status != 1, axis=1, kind='stable') # in-stock items by index
+
+        rows, ranks = np.nonzero(np.arange(num_commit.max())[None, :] < num_commit[:, None])
+        cols = sorted_orders[rows, ranks]
+        item_index = inv_items[rows, ranks]
+
+        self.order_status[rows, cols] = 1
+        early_periods = self.req_desired_time[rows, cols] - t
+        self.item_status[rows, item_index] = 0
+        self.item_rp[rows, item_index] = early_periods + self.req_realized_cycle_duration[rows, cols]
+        self.item_errp[rows, item_index] = early_periods + self.pred_window_cycle_duration
+        self.item_cir_cnt[rows, item_index] += 1
+        self.current_inv -= num_commit
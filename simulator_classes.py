@@ -2,8 +2,14 @@
 # Xuening Wang
 # 2022/04/14
 
+import heapq
+import itertools
+from bisect import bisect_left, insort
+from functools import partial
+
 from random_generators import *
-from model_reschedule import *
+from model_reschedule import model_complete_reschedule, model_batch_admission, greedy_batch_admission, sweep_complete_reschedule, PersistentRescheduleModel
+from trace_recorder import TraceRecorder, TRACE_RETURN, TRACE_ADMIT, TRACE_REJECT, TRACE_COMMIT, TRACE_FINISH, TRACE_FAIL, TRACE_RESCHEDULE
 
 class ProductItem:
     def __init__(self, index):
@@ -31,21 +37,57 @@ class ProductItem:
            self.return_periods -= 1
            self.exp_regular_return_periods -= 1 #may be negative if delayed
 
+    def advance_periods(self, num_periods): #same as num_periods calls of update_rp_errp_per_period
+        if self.status == 0 and self.return_periods > 0:
+            step = min(num_periods, self.return_periods)
+            self.return_periods -= step
+            self.exp_regular_return_periods -= step
+
     def check_in(self):
         if self.status == 0 and self.return_periods == 0:
             self.status = 1
             self.exp_regular_return_periods = 0
             return self.index
 
+class PeriodCounter:
+    # Fenwick tree counting entries by period over [0, size), e.g. out items by (absolute) expected return period;
+    # the few entries at or beyond size (after the horizon) are kept in a plain dict
+    def __init__(self, size):
+        self.size = size
+        self.tree = [0] * (size + 1)
+        self.beyond = {}
+        self.total = 0
+
+    def add(self, time, cnt):
+        self.total += cnt
+        if time >= self.size:
+            self.beyond[time] = self.beyond.get(time, 0) + cnt
+            return
+        i = max(time, 0) + 1
+        while i <= self.size:
+            self.tree[i] += cnt
+            i += i & (-i)
+
+    def count_by(self, time): # number of entries expected back by time (inclusive)
+        cnt = 0
+        i = min(time, self.size - 1) + 1
+        while i > 0:
+            cnt += self.tree[i]
+            i -= i & (-i)
+        if time >= self.size:
+            cnt += sum(c for t, c in self.beyond.items() if t <= time)
+        return cnt
+
 class Inventory:
-    def __init__(self, paras):
+    def __init__(self, paras, trace=None):
         self.paras = paras
         # Create item set(list)
         self.num_items = paras['total_items']
         self.items = [ProductItem(i) for i in range(self.num_items)]
         self.enable_output_file = paras['enable_output_file']
+        self.trace = trace if trace is not None else TraceRecorder()
 
-    def initialize(self):
+    def initialize(self, rng=np.random):
         # starting_inv = self.paras['starting_inv']
         # num_out = self.num_items - starting_inv
         #
@@ -62,28 +104,80 @@ class Inventory:
         # in the parameters after calibration, num_out should be 0 (so no change essentially)
         starting_inv = self.paras['starting_inv']
         self.current_inv = starting_inv
+        self.initialize_exp_return_calendar()
 
         num_out = self.num_items - starting_inv
         cycle_duration_lognormal_percentile = self.paras['cycle_duration_lognormal_percentile']
         if num_out > 0:
             for j in range(num_out):
-                errp = uniform_discrete_one(1, cycle_duration_lognormal_percentile+1)
+                errp = uniform_discrete_one(1, cycle_duration_lognormal_percentile+1, rng)
                 self.items[j].init_out(rp = errp, errp = errp) # first random number generated here!
+                self.add_exp_return(j, errp)
+
+    # Expected-return calendar: an out item is expected back at (now + errp). errp counts down together with
+    # the clock while the item is out, so that absolute period never changes until the item is checked in.
+    # The overdue queue is a min-heap of (check time, item_index): an item is first due once the clock reaches its
+    # expected return time (errp <= 0), then whenever the delay handling queues it again (schedule_overdue_check,
+    # when its grace window ends). Entries whose time no longer matches item_overdue_check (item returned or
+    # re-queued) are skipped lazily.
+    def initialize_exp_return_calendar(self):
+        self.clock = 0
+        self.item_exp_return_time = [None] * self.num_items
+        self.exp_return_calendar = PeriodCounter(self.paras['time_horizon'] + 1)
+        self.item_overdue_check = [None] * self.num_items
+        self.overdue_queue = []
+
+    def add_exp_return(self, item_index, errp):
+        exp_return_time = self.clock + int(errp)
+        self.item_exp_return_time[item_index] = exp_return_time
+        self.exp_return_calendar.add(exp_return_time, 1)
+        self.item_overdue_check[item_index] = exp_return_time
+        heapq.heappush(self.overdue_queue, (exp_return_time, item_index))
+
+    def remove_exp_return(self, item_index):
+        self.exp_return_calendar.add(self.item_exp_return_time[item_index], -1)
+        self.item_exp_return_time[item_index] = None
+        self.item_overdue_check[item_index] = None
+
+    def pop_overdue_items(self):
+        # out items whose overdue check is due now, by index: newly overdue items and those whose grace window
+        # ended. Only these are touched; the caller queues the next check with schedule_overdue_check
+        overdue_items = []
+        while self.overdue_queue and self.overdue_queue[0][0] <= self.clock:
+            check_time, item_index = heapq.heappop(self.overdue_queue)
+            if self.item_overdue_check[item_index] == check_time:
+                overdue_items.append(item_index)
+        overdue_items.sort()
+        return overdue_items
+
+    def schedule_overdue_check(self, item_index, check_time):
+        self.item_overdue_check[item_index] = check_time
+        heapq.heappush(self.overdue_queue, (check_time, item_index))
 
     def update_rp_errp_per_period(self):
         for it in self.items:
             it.update_rp_errp_per_period()
+        self.clock += 1 # expected return times of out items stay put
+
+    def advance_periods(self, num_periods): # idle periods skipped by the event-driven run
+        if num_periods > 0:
+            for it in self.items:
+                it.advance_periods(num_periods)
+            self.clock += num_periods
 
     def receive_returns(self):
         return_items = []
         for it in self.items:
             id = it.check_in()
+            if id is not None:
+                self.remove_exp_return(id)
+                self.trace.record(TRACE_RETURN, self.clock, item_index=id)
             if id:
                 return_items.append(id)
         self.current_inv += len(return_items)
         # REPORT
         if self.enable_output_file:
-            print("Returned items", return_items)
+            self.trace.report("Returned items", return_items)
         return return_items
 
     def take_inv_items_list(self):
@@ -91,22 +185,21 @@ class Inventory:
 
     def sendout_items(self, item_index_list, errp_list, rp_list):
         for i in range(len(item_index_list)):
-            self.items[item_index_list[i]].send_out(rp_list[i], errp_list[i])
+            it = self.items[item_index_list[i]]
+            if it.status == 1:
+                self.add_exp_return(it.index, errp_list[i])
+            it.send_out(rp_list[i], errp_list[i])
             self.current_inv -= 1
         # REPORT
         if self.enable_output_file:
-            print("Send out items: ", item_index_list)
-            print("Will be back in: ", rp_list, " (realized), expected to be back in: ", errp_list[i])
+            self.trace.report("Send out items: ", item_index_list)
+            self.trace.report("Will be back in: ", rp_list, " (realized), expected to be back in: ", errp_list[i])
 
     def predict_future_inv_median_cycle(self, time, future_time, inv_occup_record):
-        current_inv = 0
-        future_exp_return = 0
-        for it in self.items: # inv + on time now could come back before a future time
-            if it.status == 1:
-                current_inv += 1
-            elif it.status == 0:
-                if time + it.exp_regular_return_periods <= future_time: # note: all the overdue items are counted too
-                    future_exp_return += 1
+        # inv + on time now could come back before a future time, read off the expected-return calendar
+        # (time is the current period, i.e. self.clock)
+        current_inv = self.num_items - self.exp_return_calendar.total
+        future_exp_return = self.exp_return_calendar.count_by(future_time) # note: all the overdue items are counted too
 
         num_occupied_items = inv_occup_record[future_time]
         future_raw_inv = current_inv + future_exp_return - num_occupied_items
@@ -116,7 +209,7 @@ class Inventory:
     def report_current_inv(self):
         # REPORT
         if self.enable_output_file:
-            print("Current inv quantity:", self.current_inv)
+            self.trace.report("Current inv quantity:", self.current_inv)
         return self.current_inv
 
     def report_current_inv_id(self):
@@ -146,6 +239,128 @@ class Inventory:
         avg_cir_cnt = sum(item_cir_cnt)/self.num_items
         return avg_cir_cnt, item_cir_cnt
 
+class ProductItemView:
+    # read-only stand-in for ProductItem, backed by one row of ArrayInventory
+    def __init__(self, inventory, index):
+        self.inventory = inventory
+        self.index = index
+
+    @property
+    def status(self):
+        return int(self.inventory.status[self.index])
+
+    @property
+    def return_periods(self):
+        return int(self.inventory.return_periods[self.index])
+
+    @property
+    def exp_regular_return_periods(self):
+        return int(self.inventory.exp_regular_return_periods[self.index])
+
+    @property
+    def cir_cnt(self):
+        return int(self.inventory.cir_cnt[self.index])
+
+class ArrayInventory(Inventory):
+    # same interface as Inventory, but item states live in NumPy arrays (one entry per item)
+    # so per-period updates and counts are vectorized; meant for large catalogs
+    def __init__(self, paras, trace=None):
+        self.paras = paras
+        self.num_items = paras['total_items']
+        self.status = np.ones(self.num_items, dtype=np.int8) #1 for in inventory, 0 for on the way
+        self.return_periods = np.zeros(self.num_items, dtype=np.int64)
+        self.exp_regular_return_periods = np.zeros(self.num_items, dtype=np.int64)
+        self.cir_cnt = np.zeros(self.num_items, dtype=np.int64)
+        self.items = [ProductItemView(self, i) for i in range(self.num_items)]
+        self.enable_output_file = paras['enable_output_file']
+        self.trace = trace if trace is not None else TraceRecorder()
+
+    def initialize(self, rng=np.random):
+        starting_inv = self.paras['starting_inv']
+        self.current_inv = starting_inv
+        self.initialize_exp_return_calendar()
+
+        num_out = self.num_items - starting_inv
+        cycle_duration_lognormal_percentile = self.paras['cycle_duration_lognormal_percentile']
+        if num_out > 0:
+            # one draw per item, same random stream as Inventory.initialize
+            errp = [uniform_discrete_one(1, cycle_duration_lognormal_percentile+1, rng) for j in range(num_out)]
+            self.status[:num_out] = 0
+            self.return_periods[:num_out] = errp
+            self.exp_regular_return_periods[:num_out] = errp
+            self.cir_cnt[:num_out] += 1
+            for j in range(num_out):
+                self.add_exp_return(j, errp[j])
+
+    def update_rp_errp_per_period(self):
+        moving = (self.status == 0) & (self.return_periods > 0)
+        self.return_periods[moving] -= 1
+        self.exp_regular_return_periods[moving] -= 1 #may be negative if delayed
+        self.clock += 1
+
+    def advance_periods(self, num_periods):
+        if num_periods > 0:
+            step = np.where(self.status == 0, np.minimum(self.return_periods, num_periods), 0)
+            self.return_periods -= step
+            self.exp_regular_return_periods -= step
+            self.clock += num_periods
+
+    def receive_returns(self):
+        arrived = np.flatnonzero((self.status == 0) & (self.return_periods == 0))
+        self.status[arrived] = 1
+        self.exp_regular_return_periods[arrived] = 0
+        for id in arrived.tolist():
+            self.remove_exp_return(id)
+            self.trace.record(TRACE_RETURN, self.clock, item_index=id)
+        return_items = [id for id in arrived.tolist() if id] # item 0 is left out, as in Inventory.receive_returns
+        self.current_inv += len(return_items)
+        # REPORT
+        if self.enable_output_file:
+            self.trace.report("Returned items", return_items)
+        return return_items
+
+    def take_inv_items_list(self):
+        return [self.items[i] for i in np.flatnonzero(self.status == 1)]
+
+    def sendout_items(self, item_index_list, errp_list, rp_list):
+        # an item listed twice is sent out once with its first (rp, errp), as with ProductItem.send_out
+        item_index, first = np.unique(np.asarray(item_index_list, dtype=np.int64), return_index=True)
+        in_stock = self.status[item_index] == 1
+        item_index, first = item_index[in_stock], first[in_stock]
+        self.status[item_index] = 0
+        self.return_periods[item_index] = np.asarray(rp_list)[first]
+        self.exp_regular_return_periods[item_index] = np.asarray(errp_list)[first]
+        self.cir_cnt[item_index] += 1
+        for id, errp in zip(item_index.tolist(), self.exp_regular_return_periods[item_index].tolist()):
+            self.add_exp_return(id, errp)
+        self.current_inv -= len(item_index_list)
+        # REPORT
+        if self.enable_output_file:
+            self.trace.report("Send out items: ", item_index_list)
+            self.trace.report("Will be back in: ", rp_list, " (realized), expected to be back in: ", errp_list[-1])
+
+    def report_current_inv_id(self):
+        return np.flatnonzero(self.status == 1).tolist()
+
+    def report_one_item_status(self, index):
+        return int(self.status[index])
+
+    def report_return_flow(self):
+        out = np.flatnonzero(self.status == 0)
+        return np.column_stack((out, self.exp_regular_return_periods[out], self.return_periods[out])).tolist()
+
+    def report_exp_return_flow(self):
+        out = np.flatnonzero(self.status == 0)
+        return np.column_stack((out, self.exp_regular_return_periods[out])).tolist()
+
+    def report_max_item_return_time(self):
+        return int(self.return_periods[self.status == 0].max(initial=0))
+
+    def report_item_cir_stats(self):
+        item_cir_cnt = self.cir_cnt.tolist()
+        avg_cir_cnt = sum(item_cir_cnt)/self.num_items
+        return avg_cir_cnt, item_cir_cnt
+
 class CustomerRequest:
     def __init__(self, index, order_time, desired_periods, realized_cycle_duration):
         self.index = index
@@ -175,7 +390,7 @@ class CustomerRequest:
 
 
 class CustomerOrder: #only for admitted (available & chosen) requests
-    def __init__(self, req_index, order_time, desired_periods, realized_cycle_duration, enable_output_file):
+    def __init__(self, req_index, order_time, desired_periods, realized_cycle_duration, enable_output_file, trace=None):
         self.req_index = req_index
         self.order_time = order_time
         self.desired_periods = desired_periods
@@ -185,39 +400,200 @@ class CustomerOrder: #only for admitted (available & chosen) requests
         self.realized_cycle_duration = realized_cycle_duration
 
         self.enable_output_file = enable_output_file
+        self.trace = trace if trace is not None else TraceRecorder()
+        self.registry = None # set by OrderRegistry.add
+
+    def set_status(self, status):
+        old_status = self.status
+        self.status = status
+        if self.registry is not None:
+            self.registry.update_status(self, old_status)
 
     def commit_order(self, item_index, commit_time):
-        self.status = 1 # 1 for "commit"
+        self.set_status(1) # 1 for "commit"
         self.commit_item = item_index
         self.commit_time = commit_time
+        self.trace.record(TRACE_COMMIT, commit_time, self.req_index, item_index)
         # REPORT
         if self.enable_output_file:
-            print("  assign item %d to order %d" % (item_index, self.req_index))
+            self.trace.report("  assign item %d to order %d" % (item_index, self.req_index))
 
     def finish_order(self, finish_time):
-        self.status = 2 # 2 for "success"
+        self.set_status(2) # 2 for "success"
         self.finish_time = finish_time
+        self.trace.record(TRACE_FINISH, finish_time, self.req_index)
         # REPORT
         if self.enable_output_file:
-            print("  order %d successful, desired time %s :)" % (self.req_index, self.desired_time))
+            self.trace.report("  order %d successful, desired time %s :)" % (self.req_index, self.desired_time))
 
     def fail_order(self, fail_time):
-        self.status = -2 # -2 for "failure"
+        self.set_status(-2) # -2 for "failure"
         self.fail_time = fail_time
+        self.trace.record(TRACE_FAIL, fail_time, self.req_index)
         # REPORT
         if self.enable_output_file:
-            print("  order %d expired and failed, desired time %s :(" %(self.req_index, self.desired_time))
+            self.trace.report("  order %d expired and failed, desired time %s :(" %(self.req_index, self.desired_time))
 
     # def save_later_order(self):
     #     self.status = 5
     #     print("  order saved for later: %d"%self.req_index)
 
-class NominalSchedule:
+class OrderRegistry:
+    # All orders in creation order (list-like), plus indexes so that per-period work only touches active orders:
+    # req_index -> order, orders per status, and uncommitted orders by desired time
+    def __init__(self, time_horizon):
+        self.orders = []
+        self.by_req_index = {}
+        self.by_status = {0: {}, 1: {}, 2: {}, -2: {}} # status: {req_index: order}, in the order orders reached the status
+        self.uncommitted_by_desired_time = PeriodCounter(time_horizon + 1)
+        self.uncommitted_due_heap = [] # (desired_time, creation seq, order); orders no longer uncommitted are skipped lazily
+
+    def __len__(self):
+        return len(self.orders)
+
+    def __iter__(self):
+        return iter(self.orders)
+
+    def __getitem__(self, key):
+        return self.orders[key]
+
+    def add(self, od):
+        od.registry = self
+        heapq.heappush(self.uncommitted_due_heap, (od.desired_time, len(self.orders), od))
+        self.orders.append(od)
+        self.by_req_index[od.req_index] = od
+        self.by_status[od.status][od.req_index] = od
+        self.uncommitted_by_desired_time.add(od.desired_time, 1)
+
+    def update_status(self, od, old_status):
+        self.by_status[old_status].pop(od.req_index)
+        self.by_status[od.status][od.req_index] = od
+        if old_status == 0:
+            self.uncommitted_by_desired_time.add(od.desired_time, -1)
+
+    def get_order(self, req_index):
+        return self.by_req_index[req_index]
+
+    def orders_with_status(self, status):
+        return list(self.by_status[status].values())
+
+    def count_uncommitted_due_before(self, future_time):
+        return self.uncommitted_by_desired_time.count_by(future_time - 1)
+
+    def pop_uncommitted_due_by(self, time):
+        # uncommitted orders with desired_time <= time; the caller is expected to fail them
+        due_orders = []
+        while self.uncommitted_due_heap and self.uncommitted_due_heap[0][0] <= time:
+            od = heapq.heappop(self.uncommitted_due_heap)[2]
+            if od.status == 0:
+                due_orders.append(od)
+        return due_orders
+
+class EventCalendar:
+    # min-heap of wake-up times for the event-driven run; all events at one time share one period update
+    def __init__(self, time_horizon):
+        self.time_horizon = time_horizon
+        self.now = -1
+        self.heap = []
+        self.seq = itertools.count() # tie-breaker, payloads are never compared
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, time, kind, payload=None):
+        # times already processed or beyond the horizon are dropped
+        time = int(time) # return periods may come in as whole floats
+        if self.now < time < self.time_horizon:
+            heapq.heappush(self.heap, (time, next(self.seq), kind, payload))
+
+    def pop_next(self):
+        time = self.heap[0][0]
+        fired = []
+        while self.heap and self.heap[0][0] == time:
+            _, _, kind, payload = heapq.heappop(self.heap)
+            fired.append((kind, payload))
+        self.now = time
+        return time, fired
+
+class ScheduleIndex:
+    # Indexes over the nominal schedule so that per-period lookups need not scan it: requests by start time
+    # (buckets in admission order + sorted distinct starts) and each item's bookings as a sorted (start, req_index) list
     def __init__(self):
+        self.by_start = {} # start: {req_index: None}
+        self.starts = [] # sorted starts with a non-empty bucket
+        self.item_bookings = {} # item_index: [(start, req_index)] sorted
+
+    def add(self, req_index, start):
+        if start not in self.by_start:
+            self.by_start[start] = {}
+            insort(self.starts, start)
+        self.by_start[start][req_index] = None
+
+    def remove(self, req_index, start, item_index=None):
+        bucket = self.by_start[start]
+        bucket.pop(req_index)
+        if not bucket:
+            self.by_start.pop(start)
+            self.starts.pop(bisect_left(self.starts, start))
+        if item_index is not None:
+            self.unbook(req_index, start, item_index)
+
+    def book(self, req_index, start, item_index):
+        insort(self.item_bookings.setdefault(item_index, []), (start, req_index))
+
+    def unbook(self, req_index, start, item_index):
+        bookings = self.item_bookings[item_index]
+        bookings.pop(bisect_left(bookings, (start, req_index)))
+
+    def starting_at(self, t):
+        return list(self.by_start.get(t, ()))
+
+    def starting_before(self, t):
+        return [req_index for start in self.starts[:bisect_left(self.starts, t)] for req_index in self.by_start[start]]
+
+    def in_start_order(self): # ties in admission order
+        return [req_index for start in self.starts for req_index in self.by_start[start]]
+
+    def bookings_of(self, item_index):
+        return self.item_bookings.get(item_index, [])
+
+    def bookings_before(self, item_index, time): # the item's bookings starting before time
+        bookings = self.bookings_of(item_index)
+        return bookings[:bisect_left(bookings, (time, -1))]
+
+class NominalSchedule:
+    def __init__(self, reschedule_model="rebuild", solver_backend=None, formulation="dense", delay_scope="full",
+                 time_limit=None, telemetry=None, solve_cache=None):
         self.ns_start = {}
         self.ns_length = {}
         self.ns_assign_item = {}
-        self.on_schedule_req_list = []
+        self.on_schedule_reqs = {} # req_index: None, in admission order (O(1) removal)
+        self.index = ScheduleIndex()
+        self.assign_order = {} # req_index: position in ns_assign_item, which decides the request a delay hits first
+        # rebuild: a new model_complete_reschedule per solve; persistent: one PersistentRescheduleModel kept up to date;
+        # sweep: sweep_complete_reschedule, the exact combinatorial solve (no MIP)
+        self.reschedule_model = reschedule_model
+        # time_limit: seconds per solve call (None: solve to optimality); telemetry: a SolveTelemetry recording every call
+        self.time_limit = time_limit
+        self.telemetry = telemetry
+        if reschedule_model == "sweep":
+            self.complete_reschedule = partial(sweep_complete_reschedule, telemetry=telemetry)
+        else: # opt_backend backend (None: gurobi when installed, else highs) and dense/sparse formulation for rebuild
+            self.complete_reschedule = partial(model_complete_reschedule, backend=solver_backend, formulation=formulation,
+                                               time_limit=time_limit, telemetry=telemetry)
+        # solve_cache: a ScheduleSolveCache answering repeated complete reschedules (not the persistent model)
+        if solve_cache is not None:
+            self.complete_reschedule = solve_cache.cached(self.complete_reschedule, (reschedule_model, solver_backend, formulation, time_limit), telemetry)
+        # batched admission: the MIP for rebuild; for sweep, one sweep check per request in priority order (exact for
+        # rule prefix, a maximal rather than maximum batch for fifo and edd)
+        if reschedule_model == "sweep":
+            self.batch_admission = greedy_batch_admission
+        else:
+            self.batch_admission = partial(model_batch_admission, backend=solver_backend, formulation=formulation,
+                                           time_limit=time_limit, telemetry=telemetry)
+        # full: re-solve every request on a delay; component: only the delayed item's conflict component (not persistent)
+        self.delay_scope = delay_scope
+        self.persistent_model = None
 
     def initialize(self, num_items, initial_rt_flow):
         self.num_items = num_items
@@ -231,17 +607,44 @@ class NominalSchedule:
 
         update_assign = self.__model_complete_reschedule_for_new_request(new_req_index, new_req_desired_time, new_req_exp_length, t, T)
         if update_assign: # available YES
-            self.on_schedule_req_list.append(new_req_index)
-            self.ns_start.update({new_req_index: new_req_desired_time})
-            self.ns_length.update({new_req_index: new_req_exp_length})
+            self.__add_nominal_schedule_one(new_req_index, new_req_desired_time, new_req_exp_length)
             # use newly solved schedule as the nominal schedule for all requests
-            self.ns_assign_item = update_assign
+            self.__set_assign(update_assign)
             return True # can accommodate the new request
         else:
             return False
 
+    def reschedule_for_new_requests_batch(self, crs, median_cycle_duration, t, T, rule): #crs: a period's arrivals in order
+        # one solve for all of them, see model_batch_admission. rule: prefix (longest prefix in arrival order),
+        # fifo (most requests, earlier arrivals first on ties) or edd (most requests, earlier desired time first)
+        if self.reschedule_model == "persistent":
+            raise ValueError("batched admission needs the rebuild or sweep reschedule model, not persistent")
+        batch = sorted(crs, key=lambda cr: cr.desired_time) if rule == "edd" else crs
+        ns_start = self.ns_start.copy()
+        ns_start.update({cr.index: cr.desired_time for cr in batch})
+        ns_length = self.ns_length.copy()
+        ns_length.update({cr.index: median_cycle_duration for cr in batch})
+
+        admitted, update_assign = self.batch_admission(list(self.on_schedule_reqs), [cr.index for cr in batch],
+                                                       ns_start, ns_length, self.num_items, self.item_exp_release_time.copy(), t, T, rule)
+        for cr in crs:
+            if cr.index in admitted:
+                self.__add_nominal_schedule_one(cr.index, cr.desired_time, median_cycle_duration)
+        if admitted:
+            self.__set_assign(update_assign)
+        return set(admitted)
+
     def __model_complete_reschedule_for_new_request(self, new_req_index, new_req_desired_time, new_req_exp_length, t, T):
-        req_index_list = self.on_schedule_req_list.copy()
+        if self.reschedule_model == "persistent":
+            model = self.__get_persistent_model(T)
+            model.add_request(new_req_index, new_req_desired_time, new_req_exp_length)
+            obj_val, updated_assign = model.solve(t, self.ns_assign_item, "admission")
+            if obj_val == len(self.on_schedule_reqs) + 1:
+                return updated_assign
+            model.remove_request(new_req_index) # rejected
+            return
+
+        req_index_list = list(self.on_schedule_reqs)
         req_index_list.append(new_req_index)
 
         ns_start = self.ns_start.copy()
@@ -258,57 +661,127 @@ class NominalSchedule:
         #     print(self.num_items)
         #     print(self.item_exp_release_time)
 
-        obj_val, updated_assign = model_complete_reschedule(req_index_list, ns_start, ns_length,
-                                            self.num_items, self.item_exp_release_time.copy(), t, T)
+        obj_val, updated_assign = self.complete_reschedule(req_index_list, ns_start, ns_length,
+                                            self.num_items, self.item_exp_release_time.copy(), t, T, kind="admission")
 
-        if obj_val == len(self.on_schedule_req_list) + 1: # can accommodate the new request
+        if obj_val == len(self.on_schedule_reqs) + 1: # can accommodate the new request
             return updated_assign
 
+    def __get_persistent_model(self, T):
+        if self.persistent_model is None:
+            self.persistent_model = PersistentRescheduleModel(self.num_items, self.item_exp_release_time, T, self.time_limit, self.telemetry)
+        return self.persistent_model
+
+    def __update_release_time(self, item_index, release_time):
+        self.item_exp_release_time.update({item_index: release_time})
+        if self.persistent_model is not None:
+            self.persistent_model.set_release_time(item_index, release_time)
+
     def check_order_to_commit_now(self, t):
-        due_orders = []
-        assign_info = {}
-        for req_index, start_time in self.ns_start.items():
-            if start_time == t:
-                due_orders.append(req_index)
-                assign_info.update({req_index: self.ns_assign_item[req_index]}) #assigned item id
+        due_orders = self.index.starting_at(t)
+        assign_info = {req_index: self.ns_assign_item[req_index] for req_index in due_orders} #assigned item id
         return due_orders, assign_info
 
     def commit_order_one(self, req_index, median_cycle_duration, t):
         # update release time for the attributed item
         item_index = self.ns_assign_item[req_index]
-        self.item_exp_release_time.update({item_index: t+median_cycle_duration})
+        self.__update_release_time(item_index, t+median_cycle_duration)
         self.__remove_nominal_schedule_one(req_index)
 
     def fail_order_one(self, req_index):
         self.__remove_nominal_schedule_one(req_index)
 
+    def __add_nominal_schedule_one(self, req_index, start, length):
+        self.on_schedule_reqs[req_index] = None
+        self.ns_start.update({req_index: start})
+        self.ns_length.update({req_index: length})
+        self.index.add(req_index, start)
+
+    def __set_assign(self, updated_assign):
+        # only requests that moved to another item touch the per-item bookings
+        for req_index, item_index in updated_assign.items():
+            old_item_index = self.ns_assign_item.get(req_index)
+            if old_item_index != item_index:
+                if old_item_index is not None:
+                    self.index.unbook(req_index, self.ns_start[req_index], old_item_index)
+                self.index.book(req_index, self.ns_start[req_index], item_index)
+        self.ns_assign_item = updated_assign
+        self.assign_order = {req_index: k for k, req_index in enumerate(updated_assign)}
+
     def __remove_nominal_schedule_one(self, req_index):
-        self.on_schedule_req_list.remove(req_index)
+        self.on_schedule_reqs.pop(req_index)
+        self.index.remove(req_index, self.ns_start[req_index], self.ns_assign_item[req_index])
         self.ns_start.pop(req_index)
         self.ns_length.pop(req_index)
         self.ns_assign_item.pop(req_index)
+        if self.persistent_model is not None:
+            self.persistent_model.remove_request(req_index)
 
     def extend_release_time_for_delay(self, item_index, t, exp_delay_window):
-        self.item_exp_release_time.update({item_index: t+exp_delay_window})
-        for req_index, assign_item in self.ns_assign_item.items():
-            if assign_item == item_index and self.ns_start[req_index] < self.item_exp_release_time[item_index]:
-                affected_req_index = req_index
-                return affected_req_index #Note: here we may have a invalid schedule before further processing
+        self.__update_release_time(item_index, t+exp_delay_window)
+        # of the item's bookings now starting before its release, the first one in ns_assign_item order
+        conflicts = self.index.bookings_before(item_index, self.item_exp_release_time[item_index])
+        if conflicts:
+            affected_req_index = min((req_index for _, req_index in conflicts), key=self.assign_order.get)
+            return affected_req_index #Note: here we may have a invalid schedule before further processing
 
     def reschedule_for_one_item_delay(self, affected_req_index, t, T):
-        updated_assign = self.__model_complete_reschedule_for_delay(t, T)
+        if self.delay_scope == "component" and self.reschedule_model != "persistent":
+            updated_assign = self.__component_reschedule_for_delay(self.ns_assign_item[affected_req_index], t, T)
+        else:
+            updated_assign = self.__model_complete_reschedule_for_delay(t, T)
         if updated_assign: #available YES
-            self.ns_assign_item = updated_assign
+            self.__set_assign(updated_assign)
             return True
         else: # have to fail the affected req
             self.fail_order_one(affected_req_index)
             return False
 
     def __model_complete_reschedule_for_delay(self, t, T):
-        obj_val, updated_assign = model_complete_reschedule(self.on_schedule_req_list.copy(), self.ns_start.copy(), self.ns_length.copy(),
-                                                            self.num_items, self.item_exp_release_time.copy(), t, T)
+        if self.reschedule_model == "persistent":
+            obj_val, updated_assign = self.__get_persistent_model(T).solve(t, self.ns_assign_item, "delay")
+            if obj_val == len(self.on_schedule_reqs):
+                return updated_assign
+            return
+
+        obj_val, updated_assign = self.complete_reschedule(list(self.on_schedule_reqs), self.ns_start.copy(), self.ns_length.copy(),
+                                                            self.num_items, self.item_exp_release_time.copy(), t, T, kind="delay")
+
+        if obj_val == len(self.on_schedule_reqs): # can resolve conflict
+            return updated_assign
 
-        if obj_val == len(self.on_schedule_req_list): # can resolve conflict
+    def __delay_conflict_component(self, item_index, t):
+        # Requests with overlapping windows form an interval graph, whose connected components are the runs of
+        # requests (by start time) with no gap in between. Requests outside the runs holding the delayed item's
+        # requests share no constraint with them, so their assignments stay valid as they are.
+        # Requests starting before t cannot be scheduled and fail the full re-solve too, so they are always kept in.
+        seeds = set(req_index for _, req_index in self.index.bookings_of(item_index))
+        component = []
+        block = []
+        block_end = None
+        for req_index in self.index.in_start_order():
+            if block_end is not None and self.ns_start[req_index] >= block_end: # gap: close the block
+                if seeds.intersection(block):
+                    component.extend(block)
+                block = []
+                block_end = None
+            block.append(req_index)
+            end = self.ns_start[req_index] + self.ns_length[req_index]
+            block_end = end if block_end is None else max(block_end, end)
+        if seeds.intersection(block):
+            component.extend(block)
+        in_component = set(component)
+        component.extend(req_index for req_index in self.index.starting_before(t) if req_index not in in_component)
+        return component
+
+    def __component_reschedule_for_delay(self, item_index, t, T):
+        component = self.__delay_conflict_component(item_index, t)
+        obj_val, component_assign = self.complete_reschedule(component, self.ns_start.copy(), self.ns_length.copy(),
+                                                             self.num_items, self.item_exp_release_time.copy(), t, T, kind="delay")
+
+        if obj_val == len(component): # can resolve conflict, other requests keep their items
+            updated_assign = self.ns_assign_item.copy()
+            updated_assign.update(component_assign)
             return updated_assign
 
     # def check_schedule_validity(self): # for safety
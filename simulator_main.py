@@ -8,6 +8,7 @@ import pandas as pd
 from simulator_classes import *
 from simulator_allocators import *
 from random_generators import *
+from model_reschedule import SolveTelemetry, get_solve_cache
 
 # What happened in one period:
 ## 1. count beginning inv
@@ -27,41 +28,67 @@ class MainSimulator:
 
         self.is_seed = self.paras["is_seed"]
         self.rand_seed = self.paras['rand_seed'] if self.is_seed else None
-        np.random.seed(self.rand_seed)
+        self.init_random_streams()
 
         # enable output file option
         self.enable_output_file = self.paras['enable_output_file']
+        # structured event trace (a no-op unless trace_file is set), also the sink of the REPORT text
+        self.trace = TraceRecorder(self.paras['trace_file'], self.paras['trace_events'], file_format=self.paras['trace_format'],
+                                   report=self.enable_output_file, report_file=self.paras['report_file'])
+        # one row per NomiSch schedule solve (latency, size, outcome), see SolveTelemetry
+        self.solve_telemetry = SolveTelemetry()
+        self.solve_cache = None
 
         # LOG
         if self.enable_output_file:
-            print("\n\n-----Parameters initialized-----: \n", self.paras)
+            self.trace.report("\n\n-----Parameters initialized-----: \n", self.paras)
+
+    # Each simulator owns its random streams, so several can run in one process (or in threads)
+    def init_random_streams(self):
+        if self.paras['random_streams'] == "spawn":
+            # independent Generator substreams for arrivals, desired times, cycle durations and initial inventory
+            ss_arrival, ss_desired_time, ss_cycle_duration, ss_init_inv = np.random.SeedSequence(self.rand_seed).spawn(4)
+            self.rng_arrival = np.random.default_rng(ss_arrival)
+            self.rng_desired_time = np.random.default_rng(ss_desired_time)
+            self.rng_cycle_duration = np.random.default_rng(ss_cycle_duration)
+            self.rng_init_inv = np.random.default_rng(ss_init_inv)
+        else:
+            # legacy: one stream shared in the old draw order, same numbers as np.random.seed(rand_seed) gave
+            rng = np.random.RandomState(self.rand_seed)
+            self.rng_arrival = self.rng_desired_time = self.rng_cycle_duration = self.rng_init_inv = rng
 
     # Initialize inventory and requests; contains all random number generators
     def initialize(self):
         self.time_horizon = self.paras['time_horizon']
 
-        self.inventory = Inventory(self.paras)
-        self.inventory.initialize()
+        if self.paras['inventory_engine'] == "array":
+            self.inventory = ArrayInventory(self.paras, self.trace)
+        else:
+            self.inventory = Inventory(self.paras, self.trace)
+        self.inventory.initialize(self.rng_init_inv)
 
         req_arr_lmbd = self.paras['customer_request_poisson_rate']
-        req_arr_seq = poisson_arr_discrete_seq(self.time_horizon, req_arr_lmbd)
+        legacy_order = self.paras['random_streams'] != "spawn" # vectorized sampling with the new streams only
+        req_arr_seq = poisson_arr_discrete_seq(self.time_horizon, req_arr_lmbd, self.rng_arrival, legacy_order)
         num_req_base = len(req_arr_seq)
         req_des_time_n, req_des_time_p = self.paras['customer_request_desired_time_binomial_n'], self.paras['customer_request_desired_time_binomial_p']
-        req_des_time_seq = binomial_discrete_seq(num_req_base, req_des_time_n, req_des_time_p)
+        req_des_time_seq = binomial_discrete_seq(num_req_base, req_des_time_n, req_des_time_p, self.rng_desired_time)
         self.pred_window_cycle_duration = self.paras["cycle_duration_lognormal_percentile"]
         self.cycle_duration_lognormal_mu = self.paras['cycle_duration_lognormal_mu']
         self.cycle_duration_lognormal_sigma = self.paras['cycle_duration_lognormal_sigma']
-        req_realized_cycle_seq = lognormal_rounded_up_seq(num_req_base, self.cycle_duration_lognormal_mu, self.cycle_duration_lognormal_sigma)
-        self.requests = [CustomerRequest(i, req_arr_seq[i], req_des_time_seq[i], req_realized_cycle_seq[i]) for i in range(num_req_base)]
-
-        self.remove_req_overtime()
-        self.remove_req_desired_periods_0() #to fix FOFS <100% succ order rate. only valid when length_of_delivery>0
+        req_realized_cycle_seq = lognormal_rounded_up_seq(num_req_base, self.cycle_duration_lognormal_mu, self.cycle_duration_lognormal_sigma, self.rng_cycle_duration)
+        # one pass: drop requests desired after the horizon, and those with desired_periods 0
+        # (the latter to fix FOFS <100% succ order rate. only valid when length_of_delivery>0)
+        req_arr_time = np.asarray(req_arr_seq, dtype=np.int64)
+        keep = np.flatnonzero((req_arr_time + req_des_time_seq <= self.time_horizon) & (req_des_time_seq != 0))
+        self.requests = [CustomerRequest(i, req_arr_seq[i], req_des_time_seq[i], req_realized_cycle_seq[i]) for i in keep.tolist()]
         self.num_req = len(self.requests)
-        self.req_scan_index = 0
+        # requests arrive in order_time order, so period t's arrivals are self.requests[req_period_start[t]:req_period_start[t+1]]
+        self.req_period_start = np.searchsorted(req_arr_time[keep], np.arange(self.time_horizon + 1)).tolist()
 
         self.length_of_delivery = self.paras['length_of_delivery']
 
-        self.orders = []
+        self.orders = OrderRegistry(self.time_horizon)
 
         self.cr_full_list = [[cr.index, cr.order_time, cr.order_time + cr.desired_periods, cr.realized_cycle_duration]
                              for cr in self.requests]
@@ -69,15 +96,15 @@ class MainSimulator:
         self.initial_rt_flow = self.inventory.report_return_flow()
         # REPORT
         if self.enable_output_file:
-            print("\n-----Initialization Phase-----\n")
-            print("Total inv: %d, In stock inv: %d" %(self.inventory.num_items, self.inventory.report_current_inv()))
-            print("Customer request full list: ")
+            self.trace.report("\n-----Initialization Phase-----\n")
+            self.trace.report("Total inv: %d, In stock inv: %d" %(self.inventory.num_items, self.inventory.report_current_inv()))
+            self.trace.report("Customer request full list: ")
             for cr in self.cr_full_list:
-                print("  index: %d, will order at time: %d, desired arrival at time: %d; realized cycle duration: %d" %(cr[0], cr[1], cr[2], cr[3]))
+                self.trace.report("  index: %d, will order at time: %d, desired arrival at time: %d; realized cycle duration: %d" %(cr[0], cr[1], cr[2], cr[3]))
 
-            print("Item returning flow: ")
+            self.trace.report("Item returning flow: ")
             for rt in self.initial_rt_flow:
-                print("  index: %d, exp return: %d, will return: %d" %(rt[0], rt[1], rt[2]))
+                self.trace.report("  index: %d, exp return: %d, will return: %d" %(rt[0], rt[1], rt[2]))
 
 
     def run_and_report(self):
@@ -90,18 +117,29 @@ class MainSimulator:
 
         # (8/17) create and initial a NominalSchedule class for the nominal schedule approach
         if alloc_policy == "NomiSch":
-            self.nominal_schedule = NominalSchedule()
+            if self.paras['NomiSch_solve_cache_size'] > 0: # shared with the other runs in this process
+                self.solve_cache = get_solve_cache(self.paras['NomiSch_solve_cache_size'], self.paras['NomiSch_solve_cache_file'])
+            self.nominal_schedule = NominalSchedule(self.paras['NomiSch_reschedule_model'], self.paras['NomiSch_solver_backend'],
+                                                    self.paras['NomiSch_formulation'], self.paras['NomiSch_delay_scope'],
+                                                    self.paras['NomiSch_time_limit'], self.solve_telemetry, self.solve_cache)
             self.nominal_schedule.initialize(self.inventory.num_items, self.initial_rt_flow)
 
-        # run here
-        for t in range(time_horizon):
-            self.update_one_period(t, disp_policy, admit_policy, alloc_policy)
+        # run here; the trace is flushed and closed even when the run raises
+        with self.trace:
+            if self.paras['time_advance'] == "event":
+                self.run_event_driven(disp_policy, admit_policy, alloc_policy)
+            else:
+                for t in range(time_horizon):
+                    self.update_one_period(t, disp_policy, admit_policy, alloc_policy)
+        if self.solve_cache is not None:
+            self.solve_cache.save()
 
         EDD_lead_time = self.paras['EDD_lead_time']
         self.report_config(disp_policy, admit_policy, alloc_policy, EDD_lead_time)
         num_req, adm_rate = self.report_admission_rate()
         succ_order_rate, service_rate = self.report_succ_order_rate()
         self.report_item_cir_stats()
+        self.report_solve_telemetry()
 
         # EXPORT case static data to files
         self.export_case_info()
@@ -113,10 +151,48 @@ class MainSimulator:
 
         return num_req, adm_rate, succ_order_rate, service_rate, req_stories
 
+    def run_event_driven(self, disp_policy, admit_policy, alloc_policy):
+        # Same periods as the tick loop, but update_one_period only runs at times when an event fires:
+        # request arrivals, item returns, order deadlines (plus EDD lead-time windows and NomiSch commits),
+        # and NomiSch delay triggers. In between, only the item return counters move.
+        events = EventCalendar(self.time_horizon)
+        for cr in self.requests:
+            events.push(cr.order_time, "arrival")
+        for rt in self.initial_rt_flow:
+            self.schedule_item_events(events, rt[0], -1, alloc_policy)
+
+        last_t = -1
+        while events:
+            t, fired = events.pop_next()
+            self.inventory.advance_periods(t - last_t - 1)
+            num_orders = len(self.orders)
+            commited_items_id = self.update_one_period(t, disp_policy, admit_policy, alloc_policy)
+            last_t = t
+
+            for od in self.orders[num_orders:]:
+                events.push(od.desired_time - self.length_of_delivery, "deadline", od.req_index)
+                if alloc_policy == "EDD":
+                    events.push(od.desired_time - self.paras['EDD_lead_time'], "deadline", od.req_index)
+            for item_index in commited_items_id:
+                self.schedule_item_events(events, item_index, t, alloc_policy)
+            for kind, item_index in fired:
+                # an overdue item triggers the delay handling again when its grace window ends, until it is back
+                if kind == "delay" and self.inventory.item_overdue_check[item_index] is not None:
+                    events.push(self.inventory.item_overdue_check[item_index], "delay", item_index)
+        self.inventory.advance_periods(self.time_horizon - last_t - 1)
+
+    def schedule_item_events(self, events, item_index, t, alloc_policy):
+        # item state as of the end of period t
+        it = self.inventory.items[item_index]
+        events.push(t + 1 + it.return_periods, "return", item_index)
+        overdue_after = max(it.exp_regular_return_periods, 0)
+        if alloc_policy == "NomiSch" and overdue_after < it.return_periods:
+            events.push(t + 1 + overdue_after, "delay", item_index)
+
     def update_one_period(self, t, disp_policy, admit_policy, alloc_policy):
         # REPORT
         if self.enable_output_file:
-            print("\n----Period %d----" % t)
+            self.trace.report("\n----Period %d----" % t)
 
         # receive returning items
         self.inventory.receive_returns()
@@ -124,16 +200,15 @@ class MainSimulator:
         # (8/16) deal with return delays on the fly
         if alloc_policy == "NomiSch":
             exp_delay_window = self.paras["NomiSch_realtime_delay_grace_period"]
-            exp_rt_flow = self.inventory.report_exp_return_flow()
-            for it in exp_rt_flow:
-                if it[1] <= 0: #it[0]: item_index, it[1] exp_return_periods
-                    affected_req_index = self.nominal_schedule.extend_release_time_for_delay(it[0], t, exp_delay_window)
-                    if affected_req_index:
-                        resolve = self.nominal_schedule.reschedule_for_one_item_delay(affected_req_index, t, self.time_horizon)
-                        if not resolve: # have to fail this affected order
-                            for od in self.orders:
-                                if od.req_index == affected_req_index:
-                                    od.fail_order(t)
+            for item_index in self.inventory.pop_overdue_items(): # newly overdue, or their grace window ended
+                affected_req_index = self.nominal_schedule.extend_release_time_for_delay(item_index, t, exp_delay_window)
+                # the release time now holds for the grace window; the item is checked again when it ends
+                self.inventory.schedule_overdue_check(item_index, t + max(exp_delay_window, 1))
+                if affected_req_index:
+                    resolve = self.nominal_schedule.reschedule_for_one_item_delay(affected_req_index, t, self.time_horizon)
+                    self.trace.record(TRACE_RESCHEDULE, t, affected_req_index, item_index, int(resolve))
+                    if not resolve: # have to fail this affected order
+                        self.orders.get_order(affected_req_index).fail_order(t)
 
         # sort out current inventory
         if disp_policy == "current":
@@ -141,35 +216,35 @@ class MainSimulator:
 
             # REPORT
             if self.enable_output_file:
-                print("\nAdmission control using CURRENT inv, avai_inv: ", avai_inv)
+                self.trace.report("\nAdmission control using CURRENT inv, avai_inv: ", avai_inv)
 
             # process and admit requests
             if admit_policy == "IT0":
-                self.req_scan_index = self.scan_admit_requests_IT0(t, self.req_scan_index, avai_inv)
+                self.scan_admit_requests_IT0(t, avai_inv)
             elif admit_policy == "ITInf":
-                self.req_scan_index = self.scan_admit_requests_ITInf(t, self.req_scan_index)
+                self.scan_admit_requests_ITInf(t)
         # predict inventory
         elif disp_policy == "future":
 
             # REPORT
             if self.enable_output_file:
-                print("\nAdmission control using FUTURE inv")
+                self.trace.report("\nAdmission control using FUTURE inv")
 
             if admit_policy == "IT0":
-                self.req_scan_index = self.scan_admit_requests_IT0_future(t, self.req_scan_index)
+                self.scan_admit_requests_IT0_future(t)
             elif admit_policy == "ITInf":
-                self.req_scan_index = self.scan_admit_requests_ITInf(t, self.req_scan_index)
+                self.scan_admit_requests_ITInf(t)
 
         elif disp_policy == "future_cstp":
 
             # REPORT
             if self.enable_output_file:
-                print("\nAdmission control using FUTURE_CSTP inv")
+                self.trace.report("\nAdmission control using FUTURE_CSTP inv")
 
             if admit_policy == "IT0":
-                self.req_scan_index = self.scan_admit_requests_IT0_future(t, self.req_scan_index, use_uncmtd=1)
+                self.scan_admit_requests_IT0_future(t, use_uncmtd=1)
             elif admit_policy == "ITInf":
-                self.req_scan_index = self.scan_admit_requests_ITInf(t, self.req_scan_index)
+                self.scan_admit_requests_ITInf(t)
 
         # allocate/commit orders
         if alloc_policy == "FOFS":
@@ -179,7 +254,7 @@ class MainSimulator:
 
         # (8/17) display and commit orders by nominal schedule approach
         if admit_policy == "NomiSchCpl":
-            self.req_scan_index = self.scan_admit_requests_NS_complete_reschedule(t, self.req_scan_index)
+            self.scan_admit_requests_NS_complete_reschedule(t)
         if alloc_policy == "NomiSch":
             commited_items_id, desired_dates, realized_cycle_duration = NS_alloc(self.inventory, self.orders, self.nominal_schedule,
                                                                                 self.length_of_delivery, self.pred_window_cycle_duration, t)
@@ -195,153 +270,127 @@ class MainSimulator:
         self.update_order_per_period(t)
         self.inventory.update_rp_errp_per_period()
 
-        # #REPORT
-        # print("Future item returning flow: ")
-        # rt_flow = self.inventory.report_return_flow()
-        # for rt in rt_flow:
-        #     print("  index: %d, will return at time: %d" % (rt[0], rt[1]))
-
-    def remove_req_overtime(self):
-        for cr in self.requests[:]:
-            if cr.order_time + cr.desired_periods > self.time_horizon:
-                self.requests.remove(cr)
+        return commited_items_id
 
-    def remove_req_desired_periods_0(self):
-        for cr in self.requests[:]:
-            if cr.desired_periods == 0:
-                self.requests.remove(cr)
+    def requests_arriving_at(self, t):
+        # this period's arrivals, read from their contiguous range in self.requests without copying
+        return (self.requests[i] for i in range(self.req_period_start[t], self.req_period_start[t+1]))
 
-    def scan_admit_requests_IT0(self, t, start_index, avai_inv):
+    def scan_admit_requests_IT0(self, t, avai_inv):
         # REPORT
         if self.enable_output_file:
-            print("Threshold 0 policy")
-
-        req_cnt = 0
-        for cr in self.requests[start_index:]:
-            if cr.order_time == t:
-
-                # record story info for diagnosis
-                cr.write_story_when_admit_by_current(avai_inv)
-
-                if avai_inv > 0:
-                    cr.admit()
-                    self.create_order(cr.index, cr.order_time, cr.desired_periods, cr.realized_cycle_duration)
-                    avai_inv -= 1
-                    # REPORT
-                    if self.enable_output_file:
-                        print("  admit req: %d, " % cr.index)
-                else:
-                    cr.reject()
-                    # REPORT
-                    if self.enable_output_file:
-                        print("  reject req: %d, " % cr.index)
-                req_cnt += 1
-            else: break
-        start_index_new = start_index + req_cnt #next period scans from here
-        return start_index_new
-
-    def scan_admit_requests_IT0_future(self, t, start_index, use_uncmtd = 0):
+            self.trace.report("Threshold 0 policy")
+
+        for cr in self.requests_arriving_at(t):
+            # record story info for diagnosis
+            cr.write_story_when_admit_by_current(avai_inv)
+
+            if avai_inv > 0:
+                cr.admit()
+                self.trace.record(TRACE_ADMIT, t, cr.index, value=avai_inv)
+                self.create_order(cr.index, cr.order_time, cr.desired_periods, cr.realized_cycle_duration)
+                avai_inv -= 1
+                # REPORT
+                if self.enable_output_file:
+                    self.trace.report("  admit req: %d, " % cr.index)
+            else:
+                cr.reject()
+                self.trace.record(TRACE_REJECT, t, cr.index, value=avai_inv)
+                # REPORT
+                if self.enable_output_file:
+                    self.trace.report("  reject req: %d, " % cr.index)
+
+    def scan_admit_requests_IT0_future(self, t, use_uncmtd = 0):
         # REPORT
         if self.enable_output_file:
-            print("Threshold 0 policy")
+            self.trace.report("Threshold 0 policy")
 
         inv_occup_record = {} # consider competing orders for the same future date
         for future_t in range(t-1, self.time_horizon+1): #all future times
             inv_occup_record[future_t] = 0
 
-        req_cnt = 0
-        for cr in self.requests[start_index:]:
-            if cr.order_time == t:
-                desired_time = cr.order_time + cr.desired_periods
-                uncmtd_cnt = self.count_uncommited_order_due_by_future_time(desired_time)
-                avai_inv, current_inv, future_exp_return, num_occupied_items = self.inventory.predict_future_inv_median_cycle(t, desired_time, inv_occup_record) # predict: current_inv + future_exp_return - occupied by other predictions
-                if use_uncmtd == 1:
-                    avai_inv -= uncmtd_cnt # predict: - uncommitted_cnt (by future time)
-
-                # record story info for diagnosis
-                cr.write_story_when_admit_by_predict(avai_inv, current_inv, future_exp_return, num_occupied_items, use_uncmtd, uncmtd_cnt)
-
-                if avai_inv > 0:
-                    cr.admit()
-                    # REPORT
-                    if self.enable_output_file:
-                        print("  admit req: %d, " %cr.index, "predicted inv at time: %d is %d"%(desired_time, avai_inv))
-                    self.create_order(cr.index, cr.order_time, cr.desired_periods, cr.realized_cycle_duration)
-                    inv_occup_record[desired_time] += 1
-                else:
-                    cr.reject()
-                    # REPORT
-                    if self.enable_output_file:
-                        print("  reject req: %d, " %cr.index, "predicted inv at time: %d is %d"%(desired_time, avai_inv))
-                req_cnt += 1
-            else: break
-        start_index_new = start_index + req_cnt #next period scans from here
-        return start_index_new
-
-    def scan_admit_requests_ITInf(self, t, start_index):
-        # REPORT
-        if self.enable_output_file:
-            print("Threshold Inf policy")
+        for cr in self.requests_arriving_at(t):
+            desired_time = cr.order_time + cr.desired_periods
+            uncmtd_cnt = self.count_uncommited_order_due_by_future_time(desired_time)
+            avai_inv, current_inv, future_exp_return, num_occupied_items = self.inventory.predict_future_inv_median_cycle(t, desired_time, inv_occup_record) # predict: current_inv + future_exp_return - occupied by other predictions
+            if use_uncmtd == 1:
+                avai_inv -= uncmtd_cnt # predict: - uncommitted_cnt (by future time)
+
+            # record story info for diagnosis
+            cr.write_story_when_admit_by_predict(avai_inv, current_inv, future_exp_return, num_occupied_items, use_uncmtd, uncmtd_cnt)
 
-        req_cnt = 0
-        for cr in self.requests[start_index:]:
-            if cr.order_time == t:
+            if avai_inv > 0:
                 cr.admit()
+                self.trace.record(TRACE_ADMIT, t, cr.index, value=avai_inv)
                 # REPORT
                 if self.enable_output_file:
-                    print("  admit req: %d, " % cr.index)
+                    self.trace.report("  admit req: %d, " %cr.index, "predicted inv at time: %d is %d"%(desired_time, avai_inv))
                 self.create_order(cr.index, cr.order_time, cr.desired_periods, cr.realized_cycle_duration)
-                req_cnt += 1
-            else: break
-        start_index_new = start_index + req_cnt
-        return start_index_new
+                inv_occup_record[desired_time] += 1
+            else:
+                cr.reject()
+                self.trace.record(TRACE_REJECT, t, cr.index, value=avai_inv)
+                # REPORT
+                if self.enable_output_file:
+                    self.trace.report("  reject req: %d, " %cr.index, "predicted inv at time: %d is %d"%(desired_time, avai_inv))
 
-    def scan_admit_requests_NS_complete_reschedule(self, t, start_index):
+    def scan_admit_requests_ITInf(self, t):
         # REPORT
         if self.enable_output_file:
-            print("Nominal schedule admission - complete reschedule")
+            self.trace.report("Threshold Inf policy")
+
+        for cr in self.requests_arriving_at(t):
+            cr.admit()
+            self.trace.record(TRACE_ADMIT, t, cr.index)
+            # REPORT
+            if self.enable_output_file:
+                self.trace.report("  admit req: %d, " % cr.index)
+            self.create_order(cr.index, cr.order_time, cr.desired_periods, cr.realized_cycle_duration)
 
-        req_cnt = 0
-        for cr in self.requests[start_index:]:
-            if cr.order_time == t:
+    def scan_admit_requests_NS_complete_reschedule(self, t):
+        # REPORT
+        if self.enable_output_file:
+            self.trace.report("Nominal schedule admission - complete reschedule")
+
+        arrivals = list(self.requests_arriving_at(t))
+        batch_rule = self.paras['NomiSch_batch_admission']
+        if batch_rule is not None and arrivals: # one solve for the whole period
+            admitted = self.nominal_schedule.reschedule_for_new_requests_batch(arrivals, self.pred_window_cycle_duration, t, self.time_horizon, batch_rule)
+        for cr in arrivals:
+            if batch_rule is not None:
+                admit = cr.index in admitted
+            else:
                 admit = self.nominal_schedule.reschedule_for_one_new_request(cr, self.pred_window_cycle_duration, t, self.time_horizon)
-                if admit:
-                    cr.admit()
-                    # REPORT
-                    if self.enable_output_file:
-                        print("  admit req: %d, " % cr.index)
-                    self.create_order(cr.index, cr.order_time, cr.desired_periods, cr.realized_cycle_duration)
-                else:
-                    cr.reject()
-                    # REPORT
-                    if self.enable_output_file:
-                        print("  reject req: %d, " % cr.index)
-                req_cnt += 1
-            else: break
-        start_index_new = start_index + req_cnt
-        return start_index_new
+            if admit:
+                cr.admit()
+                self.trace.record(TRACE_ADMIT, t, cr.index)
+                # REPORT
+                if self.enable_output_file:
+                    self.trace.report("  admit req: %d, " % cr.index)
+                self.create_order(cr.index, cr.order_time, cr.desired_periods, cr.realized_cycle_duration)
+            else:
+                cr.reject()
+                self.trace.record(TRACE_REJECT, t, cr.index)
+                # REPORT
+                if self.enable_output_file:
+                    self.trace.report("  reject req: %d, " % cr.index)
 
     def create_order(self, req_id, order_time, delivery_periods, realized_cycle_duration):
-        self.orders.append(CustomerOrder(req_id, order_time, delivery_periods, realized_cycle_duration, self.enable_output_file))
+        self.orders.add(CustomerOrder(req_id, order_time, delivery_periods, realized_cycle_duration, self.enable_output_file, self.trace))
 
     def count_uncommited_order_due_by_future_time(self, future_time):
-        cnt = 0
-        for od in self.orders:
-            if od.status == 0 and od.desired_time < future_time:
-                cnt += 1
-        return cnt
+        return self.orders.count_uncommitted_due_before(future_time)
 
     def update_order_per_period(self, t):
         # REPORT
         if self.enable_output_file:
-            print("\nUpdate order info")
+            self.trace.report("\nUpdate order info")
 
-        for od in self.orders:
-            if od.status == 0 and od.desired_time <= t + self.length_of_delivery: #expired and failed
-                od.fail_order(t)
-            if od.status == 1:
-                #committed, and could return on time
-                od.finish_order(t)
+        for od in self.orders.pop_uncommitted_due_by(t + self.length_of_delivery): #expired and failed
+            od.fail_order(t)
+        for od in self.orders.orders_with_status(1):
+            #committed, and could return on time
+            od.finish_order(t)
 
 
     def report_config(self, disp_policy, admit_policy, alloc_policy, EDD_leadtime):
@@ -360,7 +409,7 @@ class MainSimulator:
     def report_succ_order_rate(self):
         print("2nd service rate (on-time arrival):")
         num_orders = len(self.orders)
-        succ_orders = [od.req_index for od in self.orders if od.status == 2]
+        succ_orders = [od.req_index for od in self.orders.orders_with_status(2)]
         succ_order_rate = len(succ_orders) / num_orders * 100
         print("  %d out of %d: %.2f %%" % (len(succ_orders), num_orders, succ_order_rate))
 
@@ -376,6 +425,17 @@ class MainSimulator:
         print("  average cnt: ", avg_cnt)
         print("  cnt for all items: ", cnt_list)
 
+    def report_solve_telemetry(self):
+        if not self.solve_telemetry.rows:
+            return
+        telemetry_df = self.solve_telemetry.to_frame()
+        print("Schedule solves:")
+        print("  calls: %d, latency p50: %.6f s, p99: %.6f s, max: %.6f s" % (len(telemetry_df), self.solve_telemetry.latency_percentile(50),
+              self.solve_telemetry.latency_percentile(99), telemetry_df['latency'].max()))
+        print("  outcomes: ", telemetry_df['outcome'].value_counts().to_dict())
+        if self.solve_cache is not None:
+            print("  cache (this process): %d hits, %d misses, %d entries" % (self.solve_cache.hits, self.solve_cache.misses, len(self.solve_cache.entries)))
+
     def export_case_info(self):
         # item-wise info
         item_info = []
@@ -392,10 +452,11 @@ class MainSimulator:
         save_dir = self.paras["export_data_dir"]
         item_datafile = os.path.join(save_dir, "itemdata_rseed" + str(self.rand_seed) + '.csv')
         req_datafile = os.path.join(save_dir, "reqdata_rseed" + str(self.rand_seed) + '.csv')
-        item_df = pd.DataFrame(item_info)
-        item_df.to_csv(item_datafile)
-        req_df = pd.DataFrame(req_info)
-        req_df.to_csv(req_datafile)
+        # run_replicas workers export the same rseed files concurrently: write a private temp file, then replace in one step
+        for datafile, info in [(item_datafile, item_info), (req_datafile, req_info)]:
+            tmp_datafile = datafile + '.%d.tmp' % os.getpid()
+            pd.DataFrame(info).to_csv(tmp_datafile)
+            os.replace(tmp_datafile, datafile)
 
     def report_req_story(self):
         # only for FOFS policy and EDD-cstp policy for comparison
@@ -0,0 +1,46 @@
+import os
+import sys
+import copy
+import random
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'upper_bounds'))
+
+import paras_debug
+
+
+@pytest.fixture
+def make_paras(tmp_path):
+    # copies of the debug parameters (config, main, dist) with the keys run_replicas adds; each override goes to
+    # the dict holding its key, and the exported case data goes to tmp_path instead of upper_bounds/data
+    def make(**overrides):
+        paras = [copy.deepcopy(p) for p in (paras_debug.parameters_config, paras_debug.parameters_main, paras_debug.parameters_dist)]
+        paras[0].update({'enable_output_file': 0, 'export_data_dir': str(tmp_path)})
+        paras[1]['diagnosis_story_output'] = 0
+        for key, value in overrides.items():
+            next((p for p in paras if key in p), paras[0])[key] = value
+        return paras
+    return make
+
+
+@pytest.fixture
+def make_instance():
+    # seeded random (n_num_items, m_num_reqs, T, item_release_time, req_order_time, req_desired_time, req_rental_length)
+    # as the UB models take it. Each range is a (low, high) for randint; a value drawn from it is mixed with the fixed
+    # release_choices / length_choices (rng.choice), so e.g. release_choices=[0] releases about half the items at 0.
+    # The desired time is the order time plus a draw from slack
+    def make(rand_seed, T, num_items, num_reqs, release, order, slack, length, release_choices=(), length_choices=()):
+        rng = random.Random(rand_seed)
+        def draw(bounds, choices):
+            value = rng.randint(*bounds)
+            return rng.choice(list(choices) + [value]) if choices else value
+        n_num_items = rng.randint(*num_items)
+        m_num_reqs = rng.randint(*num_reqs)
+        item_release_time = [draw(release, release_choices) for _ in range(n_num_items)]
+        req_order_time = [rng.randint(*order) for _ in range(m_num_reqs)]
+        req_desired_time = [req_order_time[j] + rng.randint(*slack) for j in range(m_num_reqs)]
+        req_rental_length = [draw(length, length_choices) for _ in range(m_num_reqs)]
+        return n_num_items, m_num_reqs, T, item_release_time, req_order_time, req_desired_time, req_rental_length
+    return make
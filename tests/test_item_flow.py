@@ -0,0 +1,49 @@
+import pytest
+
+from opt_backend import INTEGER, CONTINUOUS
+from UB_models import jobshop_sch, jobshop_sch_aggr, jobshop_sch_time_constrs, jobshop_sch_time_constrs_aggr, solve_item_flow, item_flow_model
+
+
+INSTANCE = dict(T=30, num_items=(1, 3), num_reqs=(3, 8), release=(0, 15), order=(0, 15), slack=(0, 10), length=(3, 12),
+                release_choices=[0], length_choices=[4, 6]) # repeated lengths make groups
+
+
+@pytest.mark.parametrize("rand_seed", range(8))
+def test_jobshop_item_flow_matches_per_item_mip(make_instance, rand_seed):
+    n_num_items, m_num_reqs, T, item_release_time, _, _, req_rental_length = make_instance(rand_seed, **INSTANCE)
+    obj_val, _ = jobshop_sch(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, backend='highs')
+    aggr_obj_val, _ = jobshop_sch_aggr(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, backend='highs')
+    assert round(aggr_obj_val) == round(obj_val)
+
+
+@pytest.mark.parametrize("rand_seed", range(8))
+def test_jobshop_time_constrs_item_flow_matches_per_item_mip(make_instance, rand_seed):
+    n_num_items, m_num_reqs, T, item_release_time, req_order_time, req_desired_time, req_rental_length = make_instance(rand_seed, **INSTANCE)
+    obj_val = jobshop_sch_time_constrs(n_num_items, m_num_reqs, T, item_release_time, req_order_time, req_desired_time,
+                                       req_rental_length, 5*T, backend='highs')
+    aggr_obj_val = jobshop_sch_time_constrs_aggr(n_num_items, m_num_reqs, T, item_release_time, req_order_time, req_desired_time,
+                                                 req_rental_length, 5*T, backend='highs')
+    assert round(aggr_obj_val) == round(obj_val)
+
+
+@pytest.mark.parametrize("rand_seed", range(8))
+def test_item_flow_splits_into_item_schedules(make_instance, rand_seed):
+    # the flow's rentals, handed back to items, respect release times and start windows and never overlap on an item
+    n_num_items, m_num_reqs, T, item_release_time, req_order_time, req_desired_time, req_rental_length = make_instance(rand_seed, **INSTANCE)
+    earliest = [max(1, req_order_time[j]) for j in range(m_num_reqs)]
+    latest = [min(req_desired_time[j], T) for j in range(m_num_reqs)]
+    horizon = T + max(req_rental_length)
+    obj_val, bound, assign = solve_item_flow("test flow", list(range(m_num_reqs)), item_release_time, req_rental_length,
+                                             earliest, latest, horizon, backend='highs')
+    assert len(assign) == round(obj_val) == round(bound)
+    for j, (i, start) in assign.items():
+        assert item_release_time[i] <= start and earliest[j] <= start <= latest[j]
+    for i in range(n_num_items):
+        rentals = sorted((start, start + req_rental_length[j]) for j, (a, start) in assign.items() if a == i)
+        assert all(end <= next_start for (_, end), (next_start, _) in zip(rentals, rentals[1:]))
+
+
+def test_integer_item_flow_has_no_continuous_vars():
+    # cpsat rejects continuous variables, so the integer flow must declare every variable integer
+    model, _, _ = item_flow_model("test flow", [0, 3], [4, 4, 6], [0, 0, 2], [10, 10, 8], 20, INTEGER, 'highs')
+    assert CONTINUOUS not in model.vtypes
@@ -0,0 +1,73 @@
+import pytest
+
+import simulator_classes
+from simulator_main import MainSimulator
+
+POLICIES = [('current', 'IT0', 'FOFS', 1), ('future', 'IT0', 'EDD', 2), ('future_cstp', 'IT0', 'EDD', 1),
+            ('future_cstp', 'ITInf', 'EDD', 3), ('future', 'IT0', 'FOFS', 1)]
+
+
+@pytest.fixture
+def checked_registry(monkeypatch):
+    # every OrderRegistry query is checked against a scan of all orders, as before the registry. Only the new
+    # (status 0) orders, which the allocators go through, must come in creation order.
+    registry_cls = simulator_classes.OrderRegistry
+    orders_with_status = registry_cls.orders_with_status
+    count_uncommitted_due_before = registry_cls.count_uncommitted_due_before
+    pop_uncommitted_due_by = registry_cls.pop_uncommitted_due_by
+    calls = {'status': 0, 'count': 0, 'due': 0}
+
+    def checked_orders_with_status(self, status):
+        got = orders_with_status(self, status)
+        expected = [od for od in self.orders if od.status == status]
+        if status == 0:
+            assert got == expected
+        else:
+            assert sorted(od.req_index for od in got) == sorted(od.req_index for od in expected)
+        calls['status'] += 1
+        return got
+
+    def checked_count_uncommitted_due_before(self, future_time):
+        got = count_uncommitted_due_before(self, future_time)
+        assert got == sum(1 for od in self.orders if od.status == 0 and od.desired_time < future_time)
+        calls['count'] += 1
+        return got
+
+    def checked_pop_uncommitted_due_by(self, time):
+        expected = [od.req_index for od in self.orders if od.status == 0 and od.desired_time <= time]
+        got = pop_uncommitted_due_by(self, time)
+        assert sorted(od.req_index for od in got) == sorted(expected)
+        calls['due'] += 1
+        return got
+
+    monkeypatch.setattr(registry_cls, 'orders_with_status', checked_orders_with_status)
+    monkeypatch.setattr(registry_cls, 'count_uncommitted_due_before', checked_count_uncommitted_due_before)
+    monkeypatch.setattr(registry_cls, 'pop_uncommitted_due_by', checked_pop_uncommitted_due_by)
+    return calls
+
+
+@pytest.mark.parametrize("disp, adm, alloc, lead_time", POLICIES)
+@pytest.mark.parametrize("rand_seed", [1, 2, 3])
+def test_registry_matches_order_scan(make_paras, checked_registry, disp, adm, alloc, lead_time, rand_seed):
+    paras_config, paras_main, paras_dist = make_paras(display_policy_wrt=disp, admission_policy=adm, allocation_policy=alloc,
+                                                      EDD_lead_time=lead_time, rand_seed=rand_seed, total_items=8, starting_inv=6)
+    simul = MainSimulator(paras_config, paras_main, paras_dist)
+    simul.initialize()
+    simul.run_and_report()
+    assert checked_registry['status'] > 0 and checked_registry['due'] > 0
+    if adm == 'IT0' and disp == 'future_cstp':
+        assert checked_registry['count'] > 0
+
+
+@pytest.mark.parametrize("alloc, lead_time", [('FOFS', 1), ('EDD', 2)])
+def test_registry_lookup_and_buckets(make_paras, alloc, lead_time):
+    paras_config, paras_main, paras_dist = make_paras(display_policy_wrt='future', allocation_policy=alloc, EDD_lead_time=lead_time,
+                                                      rand_seed=5, total_items=8, starting_inv=6)
+    simul = MainSimulator(paras_config, paras_main, paras_dist)
+    simul.initialize()
+    simul.run_and_report()
+    orders = simul.orders
+    assert len(orders) == sum(1 for cr in simul.requests if cr.status == 1)
+    for od in orders:
+        assert orders.get_order(od.req_index) is od
+    assert sum(len(orders.orders_with_status(status)) for status in orders.by_status) == len(orders)
@@ -0,0 +1,45 @@
+import pytest
+
+from model_reschedule import model_complete_reschedule, sweep_complete_reschedule
+
+
+INSTANCE = dict(T=60, num_items=(3, 3), num_reqs=(12, 12), release=(1, 30), order=(0, 60), slack=(0, 0), length=(5, 25),
+                release_choices=[0, 0])
+
+
+def reschedule_instance(make_instance, rand_seed):
+    # the complete reschedule inputs: requests start at their desired time, as NominalSchedule books them
+    n_num_items, m_num_reqs, T, item_release_time, _, req_desired_time, req_rental_length = make_instance(rand_seed, **INSTANCE)
+    req_index_list = list(range(m_num_reqs))
+    t = rand_seed % 6
+    return req_index_list, dict(enumerate(req_desired_time)), dict(enumerate(req_rental_length)), n_num_items, dict(enumerate(item_release_time)), t, T
+
+
+def check_assignment(updated_assign, req_index_list, ns_start, ns_length, num_items, item_exp_release_time, t):
+    # every scheduled request starts at or after t and after its item's release, and no item holds overlapping requests
+    assert set(updated_assign) <= set(req_index_list)
+    for j, i in updated_assign.items():
+        assert 0 <= i < num_items
+        assert ns_start[j] >= t and ns_start[j] >= item_exp_release_time[i]
+    for i in range(num_items):
+        windows = sorted((ns_start[j], ns_start[j] + ns_length[j]) for j, a in updated_assign.items() if a == i)
+        assert all(end <= next_start for (_, end), (next_start, _) in zip(windows, windows[1:]))
+
+
+@pytest.mark.parametrize("rand_seed", range(12))
+def test_sweep_matches_dense_reschedule(make_instance, rand_seed):
+    instance = reschedule_instance(make_instance, rand_seed)
+    sweep_obj, sweep_assign = sweep_complete_reschedule(*instance)
+    dense_obj, dense_assign = model_complete_reschedule(*instance, backend='highs', formulation='dense')
+    assert sweep_obj == round(dense_obj)
+    assert sweep_obj == len(sweep_assign)
+    req_index_list, ns_start, ns_length, num_items, item_exp_release_time, t, T = instance
+    check_assignment(sweep_assign, req_index_list, ns_start, ns_length, num_items, item_exp_release_time, t)
+    check_assignment(dense_assign, req_index_list, ns_start, ns_length, num_items, item_exp_release_time, t)
+
+
+def test_sweep_drops_requests_starting_before_t():
+    ns_start = {0: 2, 1: 10}
+    ns_length = {0: 3, 1: 3}
+    obj_val, updated_assign = sweep_complete_reschedule([0, 1], ns_start, ns_length, 2, {0: 0, 1: 0}, 5, 20)
+    assert obj_val == 1 and updated_assign == {1: 1}
@@ -0,0 +1,19 @@
+import pytest
+
+from UB_models import jobshop_sch_time_constrs_aggr, jobshop_sch_time_constrs_rolling
+
+
+INSTANCE = dict(T=80, num_items=(2, 4), num_reqs=(10, 25), release=(0, 20), order=(0, 70), slack=(0, 10), length=(5, 20),
+                release_choices=[0])
+
+
+@pytest.mark.parametrize("rand_seed", range(8))
+@pytest.mark.parametrize("window, overlap", [(20, 5), (30, 10)])
+def test_rolling_bound_brackets_exact_ub3(make_instance, rand_seed, window, overlap):
+    # schedule <= exact UB3 <= bound <= number of requests, and the reported gap is the one between them
+    instance = make_instance(rand_seed, **INSTANCE)
+    m_num_reqs, T = instance[1], instance[2]
+    obj_val, bound, gap = jobshop_sch_time_constrs_rolling(*instance, window=window, overlap=overlap, backend='highs')
+    exact_obj_val = round(jobshop_sch_time_constrs_aggr(*instance, 5*T, backend='highs'))
+    assert round(obj_val) <= exact_obj_val <= bound <= m_num_reqs
+    assert gap == pytest.approx((bound - obj_val) / max(bound, 1))
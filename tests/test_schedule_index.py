@@ -0,0 +1,64 @@
+import random
+import pytest
+
+from simulator_classes import ScheduleIndex, NominalSchedule, CustomerRequest
+
+
+@pytest.mark.parametrize("rand_seed", range(5))
+def test_schedule_index_matches_list_scan(rand_seed):
+    # random admissions, moves and removals; every query is checked against a scan of the plain schedule
+    rng = random.Random(rand_seed)
+    index = ScheduleIndex()
+    ns_start = {} # in admission order, as NominalSchedule keeps it
+    ns_assign_item = {}
+    for req_index in range(200):
+        if ns_start and rng.random() < 0.3:
+            removed = rng.choice(list(ns_start))
+            index.remove(removed, ns_start.pop(removed), ns_assign_item.pop(removed))
+        if ns_start and rng.random() < 0.3:
+            moved = rng.choice(list(ns_start))
+            index.unbook(moved, ns_start[moved], ns_assign_item[moved])
+            ns_assign_item[moved] = rng.randrange(4)
+            index.book(moved, ns_start[moved], ns_assign_item[moved])
+        ns_start[req_index] = rng.randint(0, 40)
+        ns_assign_item[req_index] = rng.randrange(4)
+        index.add(req_index, ns_start[req_index])
+        index.book(req_index, ns_start[req_index], ns_assign_item[req_index])
+
+        t = rng.randint(0, 40)
+        assert index.starting_at(t) == [j for j in ns_start if ns_start[j] == t]
+        assert sorted(index.starting_before(t)) == sorted(j for j in ns_start if ns_start[j] < t)
+        assert index.in_start_order() == sorted(ns_start, key=ns_start.get) # ties in admission order
+        for item_index in range(4):
+            assert index.bookings_before(item_index, t) == sorted((ns_start[j], j) for j in ns_start
+                                                                  if ns_assign_item[j] == item_index and ns_start[j] < t)
+
+
+def first_conflict_by_scan(schedule, item_index):
+    # the request a delay hits before the schedule index: the first booking in ns_assign_item order that now
+    # starts before the item's release
+    for req_index, assign_item in schedule.ns_assign_item.items():
+        if assign_item == item_index and schedule.ns_start[req_index] < schedule.item_exp_release_time[item_index]:
+            return req_index
+
+
+def test_delay_hits_first_request_in_assignment_order():
+    # one item, the later request admitted first: the assignment lists it first, so the delay hits it and not the
+    # request that starts earlier
+    schedule = NominalSchedule("rebuild", solver_backend='highs')
+    schedule.initialize(1, [])
+    assert schedule.reschedule_for_one_new_request(CustomerRequest(0, 0, 20, 5), 5, 0, 60)
+    assert schedule.reschedule_for_one_new_request(CustomerRequest(1, 0, 10, 5), 5, 0, 60)
+    assert list(schedule.ns_assign_item) == [0, 1]
+
+    affected_req_index = schedule.extend_release_time_for_delay(0, 5, 25)
+    assert affected_req_index == first_conflict_by_scan(schedule, 0) == 0
+
+
+def test_delay_without_conflict():
+    schedule = NominalSchedule("sweep")
+    schedule.initialize(2, [])
+    assert schedule.reschedule_for_one_new_request(CustomerRequest(0, 0, 20, 5), 5, 0, 60)
+    item_index = schedule.ns_assign_item[0]
+    assert schedule.extend_release_time_for_delay(item_index, 5, 10) is None
+    assert schedule.extend_release_time_for_delay(item_index, 5, 20) == 0
@@ -0,0 +1,29 @@
+import pytest
+
+from simulator_main import MainSimulator
+from simulator_batch import BatchSimulator
+
+POLICIES = [('current', 'IT0', 'FOFS', 1), ('current', 'ITInf', 'FOFS', 1), ('future', 'IT0', 'EDD', 2),
+            ('future_cstp', 'IT0', 'EDD', 1), ('future_cstp', 'ITInf', 'EDD', 3), ('future', 'IT0', 'FOFS', 1)]
+RAND_SEEDS = [1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("disp, adm, alloc, lead_time", POLICIES)
+@pytest.mark.parametrize("pct", [38, 60])
+def test_batch_matches_main_simulator(make_paras, disp, adm, alloc, lead_time, pct):
+    policy = dict(display_policy_wrt=disp, admission_policy=adm, allocation_policy=alloc, EDD_lead_time=lead_time,
+                  total_items=8, starting_inv=6, cycle_duration_lognormal_percentile=pct)
+    batch = BatchSimulator(*make_paras(**policy), RAND_SEEDS)
+    batch.initialize()
+    num_req, adm_rate, succ_order_rate, service_rate = batch.run_and_report()
+
+    for r, rand_seed in enumerate(RAND_SEEDS):
+        simul = MainSimulator(*make_paras(rand_seed=rand_seed, **policy))
+        simul.initialize()
+        expected = simul.run_and_report()[:4]
+        assert (num_req[r], adm_rate[r], succ_order_rate[r], service_rate[r]) == pytest.approx(expected)
+
+
+def test_batch_rejects_nominal_schedule(make_paras):
+    with pytest.raises(ValueError):
+        BatchSimulator(*make_paras(display_policy_wrt='NomiSchCpl', admission_policy='NomiSchCpl', allocation_policy='NomiSch'), RAND_SEEDS)
@@ -0,0 +1,75 @@
+import pytest
+
+from simulator_main import MainSimulator
+from trace_recorder import load_trace
+
+NOMISCH = dict(display_policy_wrt='NomiSchCpl', admission_policy='NomiSchCpl', allocation_policy='NomiSch',
+               total_items=5, starting_inv=5, time_horizon=90, NomiSch_solver_backend='highs')
+CASES = [(rand_seed, pct) for rand_seed in [1, 2, 3] for pct in [38, 70]] # 38: late returns and failed orders
+
+
+def run_nomisch(make_paras, rand_seed, pct, **overrides):
+    # (num_req, adm_rate, succ_order_rate, service_rate) of one seeded NomiSch run
+    paras = make_paras(rand_seed=rand_seed, cycle_duration_lognormal_percentile=pct, **dict(NOMISCH, **overrides))
+    simul = MainSimulator(*paras)
+    simul.initialize()
+    return tuple(simul.run_and_report()[:4])
+
+
+@pytest.mark.parametrize("rand_seed, pct", CASES)
+def test_event_driven_matches_tick(make_paras, rand_seed, pct):
+    assert run_nomisch(make_paras, rand_seed, pct, time_advance='event') == run_nomisch(make_paras, rand_seed, pct, time_advance='tick')
+
+
+@pytest.mark.parametrize("rand_seed, pct", CASES)
+def test_sparse_formulation_matches_dense(make_paras, rand_seed, pct):
+    # both are exact; on these cases their choices among optimal assignments also lead to the same run
+    assert run_nomisch(make_paras, rand_seed, pct, NomiSch_formulation='sparse') == run_nomisch(make_paras, rand_seed, pct, NomiSch_formulation='dense')
+
+
+@pytest.mark.parametrize("rand_seed, pct", CASES)
+def test_component_delay_scope_matches_full(make_paras, rand_seed, pct):
+    assert run_nomisch(make_paras, rand_seed, pct, NomiSch_delay_scope='component') == run_nomisch(make_paras, rand_seed, pct, NomiSch_delay_scope='full')
+
+
+@pytest.mark.parametrize("rand_seed, pct", CASES)
+def test_persistent_model_matches_rebuild(make_paras, rand_seed, pct):
+    # the persistent model is gurobi only, so the rebuild runs on gurobi too
+    pytest.importorskip("gurobipy")
+    persistent = run_nomisch(make_paras, rand_seed, pct, NomiSch_reschedule_model='persistent', NomiSch_solver_backend='gurobi')
+    assert persistent == run_nomisch(make_paras, rand_seed, pct, NomiSch_reschedule_model='rebuild', NomiSch_solver_backend='gurobi')
+
+
+@pytest.mark.parametrize("rand_seed, pct", CASES)
+def test_solve_cache_matches_uncached(make_paras, rand_seed, pct):
+    assert run_nomisch(make_paras, rand_seed, pct, NomiSch_solve_cache_size=64) == run_nomisch(make_paras, rand_seed, pct, NomiSch_solve_cache_size=0)
+
+
+@pytest.mark.parametrize("rand_seed, pct", CASES)
+def test_array_inventory_matches_object(make_paras, rand_seed, pct):
+    assert run_nomisch(make_paras, rand_seed, pct, inventory_engine='array') == run_nomisch(make_paras, rand_seed, pct, inventory_engine='object')
+
+
+@pytest.mark.parametrize("rand_seed, pct", CASES)
+def test_sweep_prefix_batch_matches_rebuild(make_paras, rand_seed, pct):
+    # the sweep model admits a batch with greedy_batch_admission, exact for rule prefix
+    sweep = run_nomisch(make_paras, rand_seed, pct, NomiSch_reschedule_model='sweep', NomiSch_batch_admission='prefix')
+    assert sweep == run_nomisch(make_paras, rand_seed, pct, NomiSch_reschedule_model='rebuild', NomiSch_batch_admission='prefix')
+
+
+def test_trace_closed_when_run_raises(make_paras, tmp_path, monkeypatch):
+    # events recorded before the error are flushed and the file is closed
+    trace_file = str(tmp_path / 'run.trace')
+    simul = MainSimulator(*make_paras(rand_seed=1, cycle_duration_lognormal_percentile=38, trace_file=trace_file, **NOMISCH))
+    simul.initialize()
+    update_one_period = simul.update_one_period
+    def update_until_20(t, *args):
+        if t == 20:
+            raise RuntimeError("stop")
+        return update_one_period(t, *args)
+    monkeypatch.setattr(simul, 'update_one_period', update_until_20)
+    with pytest.raises(RuntimeError):
+        simul.run_and_report()
+    assert simul.trace.file is None
+    trace_df = load_trace(trace_file)
+    assert len(trace_df) > 0 and trace_df['time'].max() < 20
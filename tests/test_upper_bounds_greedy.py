@@ -0,0 +1,39 @@
+import pytest
+
+from UB_models import knapsack_prob, knapsack_prob_greedy, schedule_compat_time_constr, schedule_compat_greedy, capacity_frontier
+from compare_bounds import calc_itemtime_resource_UB_approx
+
+
+INSTANCE = dict(T=40, num_items=(1, 3), num_reqs=(4, 10), release=(0, 20), order=(0, 20), slack=(1, 20), length=(3, 15))
+
+
+@pytest.mark.parametrize("rand_seed", range(10))
+def test_knapsack_greedy_matches_mip(make_instance, rand_seed):
+    n_num_items, m_num_reqs, T, item_release_time, _, _, req_rental_length = make_instance(rand_seed, **INSTANCE)
+    obj_val, total_slack = knapsack_prob_greedy(n_num_items, m_num_reqs, T, item_release_time, req_rental_length)
+    mip_obj_val, _ = knapsack_prob(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, backend='highs')
+    assert obj_val == round(mip_obj_val)
+    assert total_slack == n_num_items*T - sum(item_release_time) - sum(sorted(req_rental_length)[:obj_val])
+
+
+@pytest.mark.parametrize("rand_seed", range(10))
+def test_schedule_compat_greedy_matches_mip(make_instance, rand_seed):
+    n_num_items, m_num_reqs, T, _, req_order_time, req_desired_time, req_rental_length = make_instance(rand_seed, **INSTANCE)
+    obj_val = schedule_compat_greedy(n_num_items, m_num_reqs, T, req_order_time, req_desired_time, req_rental_length)
+    mip_obj_val = schedule_compat_time_constr(n_num_items, m_num_reqs, T, req_order_time, req_desired_time, req_rental_length,
+                                              5*T, backend='highs')
+    assert obj_val == round(mip_obj_val)
+
+
+@pytest.mark.parametrize("rand_seed", range(20))
+def test_capacity_frontier_matches_each_size(make_instance, rand_seed):
+    # every row equals the bounds computed on their own for the first n items (new items released at 0)
+    _, m_num_reqs, T, item_release_time, req_order_time, req_desired_time, req_rental_length = make_instance(rand_seed, **INSTANCE)
+    N = 6
+    frontier = capacity_frontier(N, m_num_reqs, T, item_release_time, req_desired_time, req_rental_length)
+    for n in range(1, N + 1):
+        release = (item_release_time + [0] * N)[:n]
+        row = frontier.iloc[n - 1]
+        assert row.ub0 == pytest.approx(calc_itemtime_resource_UB_approx(n, T, release, req_rental_length))
+        assert row.ub1 == knapsack_prob_greedy(n, m_num_reqs, T, release, req_rental_length)[0]
+        assert row.ub4 == schedule_compat_greedy(n, m_num_reqs, T, req_order_time, req_desired_time, req_rental_length)
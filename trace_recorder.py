@@ -0,0 +1,96 @@
+# Structured event trace for simulation runs, instead of grepping the REPORT prints
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # parquet output is optional, the raw binary format needs numpy only
+    pa = None
+    pq = None
+
+TRACE_EVENTS = ['return', 'admit', 'reject', 'commit', 'finish', 'fail', 'reschedule']
+TRACE_RETURN, TRACE_ADMIT, TRACE_REJECT, TRACE_COMMIT, TRACE_FINISH, TRACE_FAIL, TRACE_RESCHEDULE = range(len(TRACE_EVENTS))
+
+# one row per event; value is event specific (inv seen at admission, 1/0 for a resolved/failed reschedule)
+TRACE_DTYPE = np.dtype([('time', np.int32), ('event', np.int8), ('req_index', np.int32),
+                        ('item_index', np.int32), ('value', np.int32)])
+
+class TraceRecorder:
+    # Events go into preallocated column buffers and are written out every buffer_size events.
+    # With no file_name (or an event type left out of events) record returns right away.
+    # The REPORT text of verbose runs (enable_output_file) goes through report: to report_file, or stdout without one.
+    # Files are open from construction until close; as a context manager it closes them on exit, errors included.
+    def __init__(self, file_name=None, events=TRACE_EVENTS, buffer_size=65536, file_format='binary', report=False, report_file=None):
+        self.file_name = file_name
+        self.file_format = file_format
+        self.mask = [file_name is not None and name in events for name in TRACE_EVENTS]
+        self.buffer_size = buffer_size if file_name is not None else 0
+        self.columns = {name: np.empty(self.buffer_size, dtype=TRACE_DTYPE[name]) for name in TRACE_DTYPE.names}
+        self.size = 0
+        self.file = None
+        self.report_enabled = report
+        self.report_stream = open(report_file, 'w') if report and report_file is not None else None
+
+        if file_name is not None:
+            if file_format == 'parquet':
+                if pa is None:
+                    raise ImportError("pyarrow is required for parquet traces, use file_format='binary' instead")
+                schema = pa.schema([(name, pa.from_numpy_dtype(TRACE_DTYPE[name])) for name in TRACE_DTYPE.names])
+                self.file = pq.ParquetWriter(file_name, schema)
+            else:
+                self.file = open(file_name, 'wb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def record(self, event, time, req_index=-1, item_index=-1, value=0):
+        if not self.mask[event]:
+            return
+        n = self.size
+        columns = self.columns
+        columns['time'][n] = time
+        columns['event'][n] = event
+        columns['req_index'][n] = req_index
+        columns['item_index'][n] = item_index
+        columns['value'][n] = value
+        self.size = n + 1
+        if self.size == self.buffer_size:
+            self.flush()
+
+    def report(self, *args):
+        if self.report_enabled:
+            print(*args, file=self.report_stream)
+
+    def flush(self):
+        if self.file is None or self.size == 0:
+            return
+        if self.file_format == 'parquet':
+            self.file.write_table(pa.table({name: col[:self.size] for name, col in self.columns.items()}))
+        else:
+            rows = np.empty(self.size, dtype=TRACE_DTYPE)
+            for name, col in self.columns.items():
+                rows[name] = col[:self.size]
+            self.file.write(rows.tobytes())
+        self.size = 0
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+        if self.report_stream is not None:
+            self.report_stream.close()
+            self.report_stream = None
+
+def load_trace(file_name, file_format='binary'):
+    if file_format == 'parquet':
+        trace_df = pq.read_table(file_name).to_pandas()
+    else:
+        trace_df = pd.DataFrame(np.fromfile(file_name, dtype=TRACE_DTYPE))
+    trace_df['event'] = [TRACE_EVENTS[e] for e in trace_df['event']]
+    return trace_df
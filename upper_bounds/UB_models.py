@@ -2,50 +2,75 @@
 # Xuening Wang
 # 2022/05/28
 
-import gurobipy as grb
+import os
+import sys
+import heapq
+import itertools
+import math
 import numpy as np
-from gurobipy import GRB
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 
-def knapsack_prob(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol=0):
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # opt_backend is at the repo root
+from opt_backend import *
+
+def knapsack_prob(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol=0, backend=None):
     reqs = list(range(m_num_reqs))
 
-    model = grb.Model("knapsack")
+    model = OptModel("knapsack", backend, output_flag=1)
 
-    y = model.addVars(reqs, name='yj', vtype=GRB.BINARY)
+    y = model.add_vars(reqs, vtype=BINARY)
 
-    model.setObjective(sum(y[j] for j in reqs), GRB.MAXIMIZE)
+    model.set_objective(quicksum(y[j] for j in reqs), MAXIMIZE)
 
-    model.addConstr(grb.quicksum(y[j]*req_rental_length[j] for j in reqs) <= n_num_items*T - sum(item_release_time), name='cpcty')
+    model.add_constr(quicksum(y[j]*req_rental_length[j] for j in reqs) <= n_num_items*T - sum(item_release_time), name='cpcty')
 
     model.optimize()
     obj_val = print_solution(model)
 
     if obj_val:
         # Slack variables
-        cap_constr = model.getConstrByName('cpcty')
-        total_slack = cap_constr.Slack
+        total_slack = model.slack('cpcty')
 
         if printsol:
             for j in reqs:
-                y_val = y[j].x
-                if y_val == 0:
+                y_val = model.value(y[j])
+                if y_val < 0.5:
                     print('Req %d NOT fulfilled, length %d' % (j, req_rental_length[j]))
 
         return obj_val, total_slack
 
-def jobshop_sch(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol=0):
+def knapsack_prob_greedy(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol=0):
+    # exact for unit profits: the shortest rentals first, O(m log m). Same (obj_val, total_slack) as knapsack_prob
+    capacity = n_num_items*T - sum(item_release_time)
+    used = 0
+    fulfilled = set()
+    for j in sorted(range(m_num_reqs), key=lambda j: req_rental_length[j]):
+        if used + req_rental_length[j] > capacity:
+            break
+        used += req_rental_length[j]
+        fulfilled.add(j)
+
+    if printsol:
+        for j in range(m_num_reqs):
+            if j not in fulfilled:
+                print('Req %d NOT fulfilled, length %d' % (j, req_rental_length[j]))
+
+    return len(fulfilled), capacity - used
+
+def jobshop_sch(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol=0, backend=None):
     items = list(range(n_num_items))
     reqs = list(range(m_num_reqs))
 
-    model = grb.Model("jobshop sch")
+    model = OptModel("jobshop sch", backend, output_flag=1)
 
-    y = model.addVars(reqs, name='yj', vtype=GRB.BINARY)
-    x = model.addVars(items, reqs, name='xij', vtype=GRB.BINARY)
+    y = model.add_vars(reqs, vtype=BINARY)
+    x = model.add_vars(items, reqs, vtype=BINARY)
 
-    model.setObjective(sum(y[j] for j in reqs), GRB.MAXIMIZE)
+    model.set_objective(quicksum(y[j] for j in reqs), MAXIMIZE)
 
-    model.addConstrs(grb.quicksum(x[i, j] for i in items) == y[j] for j in reqs)
-    model.addConstrs((grb.quicksum(x[i, j]*req_rental_length[j] for j in reqs) <= T - item_release_time[i] for i in items), name='item_cpcty')
+    model.add_constrs(quicksum(x[i, j] for i in items) == y[j] for j in reqs)
+    model.add_constrs((quicksum(x[i, j]*req_rental_length[j] for j in reqs) <= T - item_release_time[i] for i in items), name='item_cpcty')
 
     model.optimize()
     obj_val = print_solution(model)
@@ -54,78 +79,77 @@ def jobshop_sch(n_num_items, m_num_reqs, T, item_release_time, req_rental_length
         # Slack variables
         item_slack_cnt = 0
         for i in items:
-            item_cpcty_constr = model.getConstrByName('item_cpcty[%d]'%i)
-            if item_cpcty_constr.Slack > 0:
+            if model.slack('item_cpcty[%d]'%i) > 0:
                 item_slack_cnt += 1
 
         if printsol:
             for i in items:
                 for j in reqs:
-                    x_val = x[i,j].x
-                    if x_val == 1:
+                    x_val = model.value(x[i,j])
+                    if x_val > 0.5:
                         print('Req %d fulfilled by item %d (release %d), length %d' % (j, i, item_release_time[i], req_rental_length[j]))
 
         return obj_val, item_slack_cnt
 
-def jobshop_sch_time_constrs(n_num_items, m_num_reqs, T, item_release_time, req_order_time, req_desired_time, req_rental_length, Q, LPrelax = 0, printsol=0):
+def jobshop_sch_time_constrs(n_num_items, m_num_reqs, T, item_release_time, req_order_time, req_desired_time, req_rental_length, Q, LPrelax = 0, printsol=0, backend=None):
     # construct model
     items = list(range(n_num_items))
     reqs = list(range(m_num_reqs))
 
-    model = grb.Model("jobshop sch time constrs")
+    model = OptModel("jobshop sch time constrs", backend, output_flag=1)
 
     # variables
-    binary_vtype = GRB.CONTINUOUS if LPrelax == 1 else GRB.BINARY
-    c_vtype = GRB.CONTINUOUS if LPrelax == 1 else GRB.INTEGER
+    binary_vtype = CONTINUOUS if LPrelax == 1 else BINARY
+    c_vtype = CONTINUOUS if LPrelax == 1 else INTEGER
 
-    y = model.addVars(reqs, name='yj', lb=0, ub=1, vtype=binary_vtype)
-    x = model.addVars(items, reqs, name='xij', lb=0, ub=1, vtype=binary_vtype)
+    y = model.add_vars(reqs, lb=0, ub=1, vtype=binary_vtype)
+    x = model.add_vars(items, reqs, lb=0, ub=1, vtype=binary_vtype)
 
     # TODO: 7/6 experiment goes here (remove z and w, replace with only x and theta)
-    # z = model.addVars(items, reqs, reqs, name='zijk', lb=0, ub=1, vtype=binary_vtype)
-    # w = model.addVars(items, reqs, reqs, name='wijk', lb=0, ub=1, vtype=binary_vtype)
-    theta = model.addVars(reqs, reqs, name='theta', vtype=binary_vtype)
+    # z = model.add_vars(items, reqs, reqs, lb=0, ub=1, vtype=binary_vtype)
+    # w = model.add_vars(items, reqs, reqs, lb=0, ub=1, vtype=binary_vtype)
+    theta = model.add_vars(reqs, reqs, vtype=binary_vtype)
 
-    c = model.addVars(reqs, vtype=c_vtype, lb=1)
+    c = model.add_vars(reqs, vtype=c_vtype, lb=1)
 
-    model.setObjective(sum(y[j] for j in reqs), GRB.MAXIMIZE)
+    model.set_objective(quicksum(y[j] for j in reqs), MAXIMIZE)
 
     # constraints
-    model.addConstrs(grb.quicksum(x[i, j] for i in items) == y[j] for j in reqs)
+    model.add_constrs(quicksum(x[i, j] for i in items) == y[j] for j in reqs)
 
     # TODO: 7/6 experiment goes here (remove z and w, replace with only x and theta)
-    # model.addConstrs(z[i, j, k] <= x[i, j] for i in items for j in reqs for k in reqs if j != k)
-    # model.addConstrs(z[i, j, k] <= x[i, k] for i in items for j in reqs for k in reqs if j != k)
-    # model.addConstrs(z[i, j, k] >= x[i, j] + x[i, k] - 1 for i in items for j in reqs for k in reqs if j != k)
+    # model.add_constrs(z[i, j, k] <= x[i, j] for i in items for j in reqs for k in reqs if j != k)
+    # model.add_constrs(z[i, j, k] <= x[i, k] for i in items for j in reqs for k in reqs if j != k)
+    # model.add_constrs(z[i, j, k] >= x[i, j] + x[i, k] - 1 for i in items for j in reqs for k in reqs if j != k)
     #
-    # model.addConstrs(w[i, j, k] <= z[i, j, k] for i in items for j in reqs for k in reqs if j != k)
-    # model.addConstrs(w[i, j, k] + w[i, k, j] == z[i, j, k] for i in items for j in reqs for k in reqs if j != k)
-    model.addConstrs(
+    # model.add_constrs(w[i, j, k] <= z[i, j, k] for i in items for j in reqs for k in reqs if j != k)
+    # model.add_constrs(w[i, j, k] + w[i, k, j] == z[i, j, k] for i in items for j in reqs for k in reqs if j != k)
+    model.add_constrs(
         c[j] + req_rental_length[j] <= c[k] + (1-theta[j,k]) * Q + (2-x[i,j]-x[i,k])*Q for i in items for j in reqs for k in reqs if j != k)
-    model.addConstrs(theta[j,k] + theta[k,j] == 1 for j in reqs for k in reqs if j<k)
-    model.addConstrs(theta[j,j] == 0 for j in reqs)
+    model.add_constrs(theta[j,k] + theta[k,j] == 1 for j in reqs for k in reqs if j<k)
+    model.add_constrs(theta[j,j] == 0 for j in reqs)
 
 
-    # model.addConstrs(c[j] + req_rental_length[j] >= c[k] - (1-w[i,j,k])*Q for i in items for j in reqs for k in reqs if j != k)
+    # model.add_constrs(c[j] + req_rental_length[j] >= c[k] - (1-w[i,j,k])*Q for i in items for j in reqs for k in reqs if j != k)
     # #TODO: <= changed to == as a valid cut
-    # model.addConstrs(c[j] + req_rental_length[j] <= T + (1-y[j]) * Q for j in reqs)
+    # model.add_constrs(c[j] + req_rental_length[j] <= T + (1-y[j]) * Q for j in reqs)
 
-    model.addConstrs(item_release_time[i] <= c[j] + (1 - x[i, j]) * Q for i in items for j in reqs)
+    model.add_constrs(item_release_time[i] <= c[j] + (1 - x[i, j]) * Q for i in items for j in reqs)
 
-    model.addConstrs(c[j] <= req_desired_time[j] + (1 - y[j]) * Q for j in reqs)
-    model.addConstrs(c[j] <= T + (1 - y[j]) for j in reqs)
-    model.addConstrs(c[j] >= (T + 1) * (1 - y[j]) for j in reqs)
+    model.add_constrs(c[j] <= req_desired_time[j] + (1 - y[j]) * Q for j in reqs)
+    model.add_constrs(c[j] <= T + (1 - y[j]) for j in reqs)
+    model.add_constrs(c[j] >= (T + 1) * (1 - y[j]) for j in reqs)
 
     # 07/05 adding to accelarate
-    model.addConstrs(c[j] >= req_order_time[j] for j in reqs)
+    model.add_constrs(c[j] >= req_order_time[j] for j in reqs)
 
 
     # TODO: 7/6 experiment goes here (remove z and w, replace with only x and theta)
     # ## auxiliary constrs
-    # model.addConstrs(z[i, j, j] == 0 for i in items for j in reqs)
-    # model.addConstrs(w[i, j, j] == 0 for i in items for j in reqs)
+    # model.add_constrs(z[i, j, j] == 0 for i in items for j in reqs)
+    # model.add_constrs(w[i, j, j] == 0 for i in items for j in reqs)
 
-    # model.setParam("OutputFlag", 0)
+    # model.output_flag = 0
 
     # solve and report
     model.optimize()
@@ -134,13 +158,188 @@ def jobshop_sch_time_constrs(n_num_items, m_num_reqs, T, item_release_time, req_
         if printsol:
             for i in items:
                 for j in reqs:
-                    x_val = x[i,j].x
-                    if x_val == 1:
+                    x_val = model.value(x[i,j])
+                    if x_val > 0.5:
                         print('Req %d fulfilled by item %d' % (j, i))
-                        print('order time: %d, desired time: %d, commitment time: %d, length: %d' %(req_order_time[j], req_desired_time[j], c[j].x, req_rental_length[j]))
+                        print('order time: %d, desired time: %d, commitment time: %d, length: %d' %(req_order_time[j], req_desired_time[j], model.value(c[j]), req_rental_length[j]))
         return obj_val
 
-def schedule_compat_time_constr(n_num_items, m_num_reqs, T, req_order_time, req_desired_time, req_rental_length, Q, printsol=0, LPrelax=0):
+# Symmetry-free jobshop bounds. Items only differ by release time and requests only by (length, start window), so
+# both are aggregated into a time-expanded flow of items: items enter at their release time, idle from t to t+1 or
+# serve a request group from start s to s + length, and w[g, s] counts the rentals of group g started at s (integer,
+# at most the group size). An item's rentals then never overlap, and any flow splits back into per-item schedules
+# (assign_items_from_flow), so the bound is exactly that of the per-item x[i, j] models, without their symmetry.
+def item_flow_model(name, item_release_time, req_rental_length, req_earliest_start, req_latest_start, horizon, vtype, backend, time_limit=None):
+    groups = {} # (length, earliest, latest): [req_index]
+    for j in range(len(req_rental_length)):
+        groups.setdefault((int(req_rental_length[j]), int(req_earliest_start[j]), int(req_latest_start[j])), []).append(j)
+    group_keys = list(groups)
+    times = list(range(horizon + 1))
+    released = [0] * (horizon + 1)
+    for rt in item_release_time:
+        if rt <= horizon:
+            released[max(int(rt), 0)] += 1
+
+    model = OptModel(name, backend, time_limit, output_flag=1)
+
+    w = {}
+    for g, (length, earliest, latest) in enumerate(group_keys):
+        for start in range(max(earliest, 0), min(latest, horizon - length) + 1):
+            w[g, start] = model.add_var(lb=0, ub=len(groups[group_keys[g]]), vtype=vtype)
+    idle = model.add_vars(times, vtype=vtype) # items idle from t to t+1 (idle[horizon]: done); integer with w, as cpsat needs
+
+    model.set_objective(quicksum(w.values()), MAXIMIZE)
+
+    arcs_out = {t: [] for t in times}
+    arcs_in = {t: [] for t in times}
+    for (g, start), var in w.items():
+        arcs_out[start].append(var)
+        arcs_in[start + group_keys[g][0]].append(var)
+    model.add_constrs(quicksum(w[g, start] for start in range(horizon + 1) if (g, start) in w) <= len(groups[group_keys[g]])
+                      for g in range(len(group_keys)))
+    model.add_constrs((quicksum(arcs_in[t]) + (idle[t-1] if t > 0 else 0) + released[t] == quicksum(arcs_out[t]) + idle[t]
+                       for t in times), name='item_flow')
+    return model, w, [(key[0], groups[key]) for key in group_keys]
+
+def assign_items_from_flow(model, w, groups, item_release_time):
+    # walk the flow in time order: items back from a rental or newly released are free, rentals starting now take
+    # free items (lowest index first), requests of a group in index order
+    starting = {}
+    for (g, start), var in w.items():
+        cnt = int(round(model.value(var)))
+        if cnt > 0:
+            starting.setdefault(start, []).append((g, cnt))
+    items_by_release = sorted(range(len(item_release_time)), key=lambda i: item_release_time[i])
+    next_req = [0] * len(groups)
+    assign = {}
+    free_items = []
+    busy = [] # (end, item)
+    r = 0
+    for start in sorted(starting):
+        while r < len(items_by_release) and item_release_time[items_by_release[r]] <= start:
+            heapq.heappush(free_items, items_by_release[r])
+            r += 1
+        while busy and busy[0][0] <= start:
+            heapq.heappush(free_items, heapq.heappop(busy)[1])
+        for g, cnt in starting[start]:
+            length, reqs = groups[g]
+            for _ in range(cnt):
+                i = heapq.heappop(free_items)
+                assign[reqs[next_req[g]]] = (i, start)
+                next_req[g] += 1
+                heapq.heappush(busy, (start + length, i))
+    return assign # req_index: (item_index, start time)
+
+def jobshop_sch_aggr(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol=0, backend=None):
+    # jobshop_sch by item flow: an item's rentals fit in T - release iff they can run back to back in [release, T]
+    model, w, groups = item_flow_model("jobshop sch aggr", item_release_time, req_rental_length, [0] * m_num_reqs,
+                                       [T] * m_num_reqs, T, INTEGER, backend)
+    model.optimize()
+    obj_val = print_solution(model)
+
+    if obj_val:
+        assign = assign_items_from_flow(model, w, groups, item_release_time)
+        item_used = [0] * n_num_items
+        for j, (i, start) in assign.items():
+            item_used[i] += req_rental_length[j]
+        item_slack_cnt = sum(1 for i in range(n_num_items) if item_used[i] < T - item_release_time[i])
+
+        if printsol:
+            for j, (i, start) in sorted(assign.items(), key=lambda a: a[1]):
+                print('Req %d fulfilled by item %d (release %d), length %d' % (j, i, item_release_time[i], req_rental_length[j]))
+
+        return obj_val, item_slack_cnt
+
+def jobshop_sch_time_constrs_aggr(n_num_items, m_num_reqs, T, item_release_time, req_order_time, req_desired_time, req_rental_length, Q, LPrelax = 0, printsol=0, backend=None):
+    # jobshop_sch_time_constrs by item flow: commitment time c in [max(1, order time), min(desired time, T)]
+    horizon = max([T] + [T + int(req_rental_length[j]) for j in range(m_num_reqs)])
+    model, w, groups = item_flow_model("jobshop sch time constrs aggr", item_release_time, req_rental_length,
+                                       [max(1, req_order_time[j]) for j in range(m_num_reqs)],
+                                       [min(req_desired_time[j], T) for j in range(m_num_reqs)],
+                                       horizon, CONTINUOUS if LPrelax == 1 else INTEGER, backend)
+    model.optimize()
+    obj_val = print_solution(model)
+    if obj_val:
+        if printsol and LPrelax != 1:
+            for j, (i, start) in sorted(assign_items_from_flow(model, w, groups, item_release_time).items(), key=lambda a: a[1]):
+                print('Req %d fulfilled by item %d' % (j, i))
+                print('order time: %d, desired time: %d, commitment time: %d, length: %d' %(req_order_time[j], req_desired_time[j], start, req_rental_length[j]))
+        return obj_val
+
+# Rolling horizon for UB3 on full instances. Primal: windows of `window` periods, `overlap` of them shared with the
+# next window, are solved in sequence by the item flow model; rentals starting before the next window are committed
+# and each item's release time becomes the end of its last committed rental. Bound: the smaller of the full item
+# flow LP and the sum over disjoint blocks of start times of each block solved on its own with the original
+# release times (each block's requests alone can do no worse than in the full schedule), blocks in parallel.
+def solve_item_flow(name, req_index_list, item_release_time, req_rental_length, req_earliest_start, req_latest_start, horizon, LPrelax=0, time_limit=None, backend=None):
+    # (obj_val, bound, assign) for the requests in req_index_list; assign as from assign_items_from_flow, with req_index
+    if not req_index_list:
+        return 0, 0, {}
+    model, w, groups = item_flow_model(name, item_release_time, [req_rental_length[j] for j in req_index_list],
+                                       [req_earliest_start[j] for j in req_index_list], [req_latest_start[j] for j in req_index_list],
+                                       horizon, CONTINUOUS if LPrelax == 1 else INTEGER, backend, time_limit)
+    model.optimize()
+    if model.status == OPTIMAL:
+        obj_val = bound = model.obj_val
+    elif model.status == TIME_LIMIT and model.values is not None:
+        obj_val = model.obj_val
+        bound = obj_val * (1 + model.mip_gap) if model.mip_gap is not None else len(req_index_list)
+    else:
+        print('Optimization ended with status %s' % model.status)
+        return 0, len(req_index_list), {}
+    assign = {} if LPrelax == 1 else {req_index_list[k]: a for k, a in assign_items_from_flow(model, w, groups, item_release_time).items()}
+    return obj_val, bound, assign
+
+def solve_item_flow_job(args):
+    return solve_item_flow(*args)
+
+def jobshop_sch_time_constrs_rolling(n_num_items, m_num_reqs, T, item_release_time, req_order_time, req_desired_time, req_rental_length, window=56, overlap=14, time_limit=None, workers=1, printsol=0, backend=None):
+    reqs = list(range(m_num_reqs))
+    earliest = [max(1, req_order_time[j]) for j in reqs]
+    latest = [min(req_desired_time[j], T) for j in reqs]
+    horizon = max([T] + [T + int(req_rental_length[j]) for j in reqs])
+    step = window - overlap
+    window_starts = list(range(1, T + 1, step))
+
+    # primal
+    release = list(item_release_time)
+    pending = [j for j in reqs if earliest[j] <= latest[j]]
+    assign = {}
+    for k, a in enumerate(window_starts):
+        last = a + window > T
+        window_reqs = [j for j in pending if earliest[j] < a + window]
+        window_latest = [min(latest[j], a + window - 1) for j in reqs]
+        _, _, window_assign = solve_item_flow("UB3 window %d" % k, window_reqs, release, req_rental_length, earliest, window_latest, horizon, time_limit=time_limit, backend=backend)
+        for j, (i, start) in window_assign.items():
+            if last or start < a + step:
+                assign[j] = (i, start)
+                release[i] = max(release[i], start + req_rental_length[j])
+        pending = [j for j in pending if j not in assign and latest[j] >= a + step]
+        if last:
+            break
+    obj_val = len(assign)
+
+    # bound
+    blocks = [[j for j in reqs if a <= earliest[j] < a + step and earliest[j] <= latest[j]] for a in window_starts]
+    block_jobs = [("UB3 block %d" % k, block, item_release_time, req_rental_length, earliest, latest, horizon, 0, time_limit, backend)
+                  for k, block in enumerate(blocks)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            block_res = list(pool.map(solve_item_flow_job, block_jobs))
+    else:
+        block_res = [solve_item_flow_job(job) for job in block_jobs]
+    _, lp_bound, _ = solve_item_flow("UB3 LP", reqs, item_release_time, req_rental_length, earliest, latest, horizon, LPrelax=1, backend=backend)
+    bound = min(math.floor(lp_bound + 1e-6), math.floor(sum(res[1] for res in block_res) + 1e-6))
+    gap = (bound - obj_val) / max(bound, 1)
+
+    print('\nRolling UB3 (window %d, overlap %d): schedule %d, bound %d, gap %.2f%%' % (window, overlap, obj_val, bound, gap * 100))
+    if printsol:
+        for j, (i, start) in sorted(assign.items(), key=lambda a: a[1]):
+            print('Req %d fulfilled by item %d' % (j, i))
+            print('order time: %d, desired time: %d, commitment time: %d, length: %d' %(req_order_time[j], req_desired_time[j], start, req_rental_length[j]))
+    return obj_val, bound, gap
+
+def schedule_compat_time_constr(n_num_items, m_num_reqs, T, req_order_time, req_desired_time, req_rental_length, Q, printsol=0, LPrelax=0, backend=None):
     # prepare data
     L_mat_delivery_window = np.zeros((m_num_reqs, m_num_reqs))
     R_mat_return_window = np.zeros((m_num_reqs, m_num_reqs))
@@ -153,17 +352,17 @@ def schedule_compat_time_constr(n_num_items, m_num_reqs, T, req_order_time, req_
     items = list(range(n_num_items))
     reqs = list(range(m_num_reqs))
 
-    model = grb.Model("schedule compat")
+    model = OptModel("schedule compat", backend, output_flag=1)
 
-    y = model.addVars(reqs, name='yj', lb=0, ub=1, vtype=GRB.BINARY)
-    x = model.addVars(items, reqs, name='xij', lb=0, ub=1, vtype=GRB.BINARY)
+    y = model.add_vars(reqs, lb=0, ub=1, vtype=BINARY)
+    x = model.add_vars(items, reqs, lb=0, ub=1, vtype=BINARY)
 
-    model.setObjective(sum(y[j] for j in reqs), GRB.MAXIMIZE)
+    model.set_objective(quicksum(y[j] for j in reqs), MAXIMIZE)
 
     # constraints
-    model.addConstrs(grb.quicksum(x[i, j] for i in items) == y[j] for j in reqs)
-    model.addConstrs((req_desired_time[k] - req_desired_time[j] >= req_rental_length[j] - (1 - L_mat_delivery_window[j][k]) * Q - (2 - x[i,j] - x[i,k]) * Q) for i in items for j in reqs for k in reqs if j != k)
-    model.addConstrs((req_desired_time[k] - req_desired_time[j] >= req_rental_length[j] - (1 - R_mat_return_window[j][k]) * Q - (2 - x[i, j] - x[i, k]) * Q) for i in items for j in reqs for k in reqs if j != k)
+    model.add_constrs(quicksum(x[i, j] for i in items) == y[j] for j in reqs)
+    model.add_constrs((req_desired_time[k] - req_desired_time[j] >= req_rental_length[j] - (1 - L_mat_delivery_window[j][k]) * Q - (2 - x[i,j] - x[i,k]) * Q) for i in items for j in reqs for k in reqs if j != k)
+    model.add_constrs((req_desired_time[k] - req_desired_time[j] >= req_rental_length[j] - (1 - R_mat_return_window[j][k]) * Q - (2 - x[i, j] - x[i, k]) * Q) for i in items for j in reqs for k in reqs if j != k)
 
     # solve and report
     model.optimize()
@@ -172,26 +371,103 @@ def schedule_compat_time_constr(n_num_items, m_num_reqs, T, req_order_time, req_
         if printsol:
             for i in items:
                 for j in reqs:
-                    x_val = x[i, j].x
-                    if x_val == 1:
+                    x_val = model.value(x[i, j])
+                    if x_val > 0.5:
                         print('Req %d fulfilled by item %d' % (j, i))
         return obj_val
 
-def knapsack_prob_slack_regl(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol=0):
+def schedule_compat_greedy(n_num_items, m_num_reqs, T, req_order_time, req_desired_time, req_rental_length, printsol=0):
+    # The big-M pairs of schedule_compat_time_constr only say that two requests on one item have disjoint windows
+    # [desired, desired + length), so UB4 is the largest set of windows with at most n overlapping at any time.
+    order = sorted(range(m_num_reqs), key=lambda j: req_desired_time[j])
+    dropped = drop_overlapping_windows(order, req_desired_time, req_rental_length, n_num_items)
+    obj_val = m_num_reqs - len(dropped)
+
+    if printsol:
+        # kept windows never overlap more than n times, so handing out free items by start time fits them all
+        free_items = list(range(n_num_items))
+        busy = [] # (end, item)
+        for j in order:
+            if j in dropped:
+                continue
+            while busy and busy[0][0] <= req_desired_time[j]:
+                heapq.heappush(free_items, heapq.heappop(busy)[1])
+            i = heapq.heappop(free_items)
+            heapq.heappush(busy, (req_desired_time[j] + req_rental_length[j], i))
+            print('Req %d fulfilled by item %d' % (j, i))
+
+    return obj_val
+
+def drop_overlapping_windows(order, req_desired_time, req_rental_length, n_num_items):
+    # Exact in O(m log m): go by start time (order) and, whenever more than n windows are open, drop the one
+    # ending last. Returns the dropped requests
+    open_ends = [] # min-heap of (end, j) of open windows
+    latest_ends = [] # max-heap of (-end, j) of the same windows; closed/dropped ones are skipped lazily in both
+    num_open = 0 # kept windows still open
+    closed = set()
+    dropped = set()
+    for j in order:
+        start = req_desired_time[j]
+        while open_ends and open_ends[0][0] <= start:
+            k = heapq.heappop(open_ends)[1]
+            if k not in dropped:
+                closed.add(k)
+                num_open -= 1
+        heapq.heappush(open_ends, (start + req_rental_length[j], j))
+        heapq.heappush(latest_ends, (-(start + req_rental_length[j]), j))
+        num_open += 1
+        if num_open > n_num_items:
+            while latest_ends[0][1] in closed or latest_ends[0][1] in dropped:
+                heapq.heappop(latest_ends)
+            dropped.add(heapq.heappop(latest_ends)[1])
+            num_open -= 1
+    return dropped
+
+def capacity_frontier(N, m_num_reqs, T, item_release_time, req_desired_time, req_rental_length):
+    # UB0, UB1 (knapsack) and UB4 (schedule compat) for every inventory size n = 1..N, using the first n items
+    # (items beyond the data are new, released at 0). Sorting is done once: UB0/UB1 come from prefix sums.
+    # UB4: every request fits from the max number of overlapping windows on; below it the levels go down from there
+    # and each drop_overlapping_windows pass only sees the windows kept at n+1, extending the dropped set (the
+    # windows dropped at capacity n+1 are also dropped at n, so the kept set is the same as from scratch).
+    release = np.zeros(N)
+    release[:min(N, len(item_release_time))] = item_release_time[:N]
+    n_list = np.arange(1, N + 1)
+    capacity = n_list*T - np.cumsum(release)
+    total_req_time = sum(req_rental_length)
+    length_prefix = np.cumsum(np.sort(req_rental_length))
+
+    order = sorted(range(m_num_reqs), key=lambda j: req_desired_time[j])
+    events = sorted([(req_desired_time[j] + req_rental_length[j], -1) for j in order] + [(req_desired_time[j], 1) for j in order])
+    max_overlap = max(itertools.accumulate(e for _, e in events), default=0) # ends before starts at equal times
+
+    ub4_list = [m_num_reqs] * N
+    kept = order
+    for n in range(min(N, max_overlap - 1), 0, -1):
+        dropped = drop_overlapping_windows(kept, req_desired_time, req_rental_length, n)
+        kept = [j for j in kept if j not in dropped]
+        ub4_list[n - 1] = len(kept)
+
+    frontier = pd.DataFrame({'n': n_list, 'ub0': capacity / total_req_time,
+                             'ub1': np.searchsorted(length_prefix, capacity, side='right'), 'ub4': ub4_list})
+    frontier['ub1_rate'] = frontier['ub1'] / m_num_reqs
+    frontier['ub4_rate'] = frontier['ub4'] / m_num_reqs
+    return frontier
+
+def knapsack_prob_slack_regl(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol=0, backend=None):
     reqs = list(range(m_num_reqs))
 
-    model = grb.Model("knapsack")
+    model = OptModel("knapsack", backend, output_flag=1)
 
-    y = model.addVars(reqs, name='yj', vtype=GRB.BINARY)
+    y = model.add_vars(reqs, vtype=BINARY)
 
-    z = model.addVar(name='z')
-    v = model.addVar(name='v')
+    z = model.add_var()
+    v = model.add_var()
 
-    model.setObjective(sum(y[j] for j in reqs) + v, GRB.MAXIMIZE)
-    model.addConstr(grb.quicksum(y[j]*req_rental_length[j] for j in reqs) + z == n_num_items*T - sum(item_release_time), name='cpcty')
+    model.set_objective(quicksum(y[j] for j in reqs) + v, MAXIMIZE)
+    model.add_constr(quicksum(y[j]*req_rental_length[j] for j in reqs) + z == n_num_items*T - sum(item_release_time), name='cpcty')
 
-    model.addConstr(v <= z)
-    model.addConstr(v <= n_num_items)
+    model.add_constr(v <= z)
+    model.add_constr(v <= n_num_items)
 
     model.optimize()
     obj_val = print_solution(model)
@@ -199,30 +475,30 @@ def knapsack_prob_slack_regl(n_num_items, m_num_reqs, T, item_release_time, req_
     if obj_val:
         if printsol:
             for j in reqs:
-                y_val = y[j].x
-                if y_val == 0:
+                y_val = model.value(y[j])
+                if y_val < 0.5:
                     print('Req %d NOT fulfilled, length %d' % (j, req_rental_length[j]))
 
         return obj_val
 
-def jobshop_sch_slack_regl(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, Q, printsol=0):
+def jobshop_sch_slack_regl(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, Q, printsol=0, backend=None):
     items = list(range(n_num_items))
     reqs = list(range(m_num_reqs))
 
-    model = grb.Model("jobshop sch")
+    model = OptModel("jobshop sch", backend, output_flag=1)
 
-    y = model.addVars(reqs, name='yj', vtype=GRB.BINARY)
-    x = model.addVars(items, reqs, name='xij', vtype=GRB.BINARY)
+    y = model.add_vars(reqs, vtype=BINARY)
+    x = model.add_vars(items, reqs, vtype=BINARY)
 
-    z = model.addVars(items, name='zi')
-    w = model.addVars(items, name='wi', vtype=GRB.BINARY)
+    z = model.add_vars(items)
+    w = model.add_vars(items, vtype=BINARY)
 
-    model.setObjective(sum(y[j] for j in reqs) + sum(w[i] for i in items), GRB.MAXIMIZE)
+    model.set_objective(quicksum(y[j] for j in reqs) + quicksum(w[i] for i in items), MAXIMIZE)
 
-    model.addConstrs(grb.quicksum(x[i, j] for i in items) == y[j] for j in reqs)
-    model.addConstrs((grb.quicksum(x[i, j]*req_rental_length[j] for j in reqs) +z[i] == T - item_release_time[i] for i in items), name='item_cpcty')
+    model.add_constrs(quicksum(x[i, j] for i in items) == y[j] for j in reqs)
+    model.add_constrs((quicksum(x[i, j]*req_rental_length[j] for j in reqs) +z[i] == T - item_release_time[i] for i in items), name='item_cpcty')
 
-    model.addConstrs(w[i] <= Q * z[i] for i in items)
+    model.add_constrs(w[i] <= Q * z[i] for i in items)
 
     model.optimize()
     obj_val = print_solution(model)
@@ -231,22 +507,22 @@ def jobshop_sch_slack_regl(n_num_items, m_num_reqs, T, item_release_time, req_re
         if printsol:
             for i in items:
                 for j in reqs:
-                    x_val = x[i,j].x
-                    if x_val == 1:
+                    x_val = model.value(x[i,j])
+                    if x_val > 0.5:
                         print('Req %d fulfilled by item %d (release %d), length %d' % (j, i, item_release_time[i], req_rental_length[j]))
 
         return obj_val
 
 def print_solution(model):
-    if model.status == GRB.OPTIMAL:
-        obj_val = model.objVal
-        print('\nObj (to max): %g' % model.objVal)
-        print('Run time: ', model.Runtime)
+    if model.status == OPTIMAL:
+        obj_val = model.obj_val
+        print('\nObj (to max): %g' % model.obj_val)
+        print('Run time (%s): ' % model.backend, model.runtime)
         return obj_val
 
-    elif model.status == GRB.INFEASIBLE:
+    elif model.status == INFEASIBLE:
         print('Model is infeasible')
-    elif model.status == GRB.UNBOUNDED:
+    elif model.status == UNBOUNDED:
         print('Model is unbounded')
     else:
-        print('Optimization ended with status %d' % model.status)
\ No newline at end of file
+        print('Optimization ended with status %s' % model.status)
\ No newline at end of file
@@ -6,8 +6,14 @@ import pandas as pd
 import numpy as np
 import sys
 import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 
-from UB_models import knapsack_prob, jobshop_sch, jobshop_sch_time_constrs, schedule_compat_time_constr
+from UB_models import knapsack_prob, jobshop_sch, jobshop_sch_time_constrs, schedule_compat_time_constr, \
+    knapsack_prob_greedy, schedule_compat_greedy, capacity_frontier, jobshop_sch_aggr, jobshop_sch_time_constrs_aggr, \
+    jobshop_sch_time_constrs_rolling
+from opt_backend import solve_stats, report_solve_stats, reset_solve_stats, merge_solve_stats
 
 def load_data(item_filename, req_filename):
     item_info = pd.read_csv(item_filename, index_col=0)
@@ -30,9 +36,21 @@ def calc_itemtime_resource_UB_approx(n_num_items, T, item_release_time, req_rent
     total_req_time = sum(req_rental_length)
     return total_avai_time/total_req_time
 
+# fast=1 solves UB1/UB4 with the exact greedy in UB_models instead of the MIP; validate=1 also solves the MIP
+# and raises if the two objectives differ (the MIP helpers return None for a zero objective, y = 0 is always feasible)
+def check_fast_UB(name, fast_obj_val, mip_obj_val):
+    if round(mip_obj_val or 0) != fast_obj_val:
+        raise ValueError("%s: greedy objective %s differs from the MIP objective %s" % (name, fast_obj_val, mip_obj_val))
+
 # UB 1: 0-1 knapsack and its LP relaxation
-def calc_knapsack_UB(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol):
-    obj_val, total_slack = knapsack_prob(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol)
+def calc_knapsack_UB(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol, backend=None, fast=0, validate=0):
+    if fast:
+        obj_val, total_slack = knapsack_prob_greedy(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol)
+        if validate:
+            mip_res = knapsack_prob(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, 0, backend)
+            check_fast_UB("UB1", obj_val, mip_res[0] if mip_res else 0)
+        return obj_val
+    obj_val, total_slack = knapsack_prob(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol, backend)
     return obj_val
 
     # # slack regularization
@@ -40,9 +58,10 @@ def calc_knapsack_UB(n_num_items, m_num_reqs, T, item_release_time, req_rental_l
     # obj_val = knapsack_prob_slack_regl(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol)
     # return obj_val
 
-# UB 2: jobshop scheduling
-def calc_jobshop_sch_UB(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, Q, printsol):
-    obj_val, item_slack_cnt = jobshop_sch(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol)
+# UB 2: jobshop scheduling (aggregate=1: item flow model without per-item variables, for large inventories)
+def calc_jobshop_sch_UB(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, Q, printsol, backend=None, aggregate=0):
+    jobshop = jobshop_sch_aggr if aggregate else jobshop_sch
+    obj_val, item_slack_cnt = jobshop(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol, backend)
     return obj_val
 
     # # slack regularization
@@ -50,17 +69,25 @@ def calc_jobshop_sch_UB(n_num_items, m_num_reqs, T, item_release_time, req_renta
     # obj_val = jobshop_sch_slack_regl(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, Q, printsol)
     # return obj_val
 
-# UB 3: jobshop scheduling with desired time constraints
-def calc_jobshop_sch_time_constraints_UB(n_num_items, m_num_reqs, T, item_release_time, req_order_time, req_desired_time, req_rental_length, Q, LPrelax, printsol):
-    obj_val = jobshop_sch_time_constrs(n_num_items, m_num_reqs, T, item_release_time, req_order_time, req_desired_time, req_rental_length, Q, LPrelax, printsol)
+# UB 3: jobshop scheduling with desired time constraints (aggregate as for UB 2)
+def calc_jobshop_sch_time_constraints_UB(n_num_items, m_num_reqs, T, item_release_time, req_order_time, req_desired_time, req_rental_length, Q, LPrelax, printsol, backend=None, aggregate=0):
+    jobshop = jobshop_sch_time_constrs_aggr if aggregate else jobshop_sch_time_constrs
+    obj_val = jobshop(n_num_items, m_num_reqs, T, item_release_time, req_order_time, req_desired_time, req_rental_length, Q, LPrelax, printsol, backend)
     return obj_val
 
 # UB 4: schedule compatibility with time constr (no release time constr)
-def calc_schedule_compat_UB(n_num_items, m_num_reqs, T, req_order_time, req_desired_time, req_rental_length, Q, printsol=0):
-    obj_val = schedule_compat_time_constr(n_num_items, m_num_reqs, T, req_order_time, req_desired_time, req_rental_length, Q, printsol=printsol, LPrelax=0)
+def calc_schedule_compat_UB(n_num_items, m_num_reqs, T, req_order_time, req_desired_time, req_rental_length, Q, printsol=0, backend=None, fast=0, validate=0):
+    if fast:
+        obj_val = schedule_compat_greedy(n_num_items, m_num_reqs, T, req_order_time, req_desired_time, req_rental_length, printsol)
+        if validate:
+            check_fast_UB("UB4", obj_val, schedule_compat_time_constr(n_num_items, m_num_reqs, T, req_order_time, req_desired_time, req_rental_length, Q, backend=backend))
+        return obj_val
+    obj_val = schedule_compat_time_constr(n_num_items, m_num_reqs, T, req_order_time, req_desired_time, req_rental_length, Q, printsol=printsol, LPrelax=0, backend=backend)
     return obj_val
 
-def scale_down_data(scale, n_num_items, m_num_reqs, item_release_time, req_desired_time, req_rental_length):
+# rseed seeds the request sampling, so a job's scaled-down data (and its cache key) is the same on every run
+def scale_down_data(scale, n_num_items, m_num_reqs, item_release_time, req_desired_time, req_rental_length, rseed=None):
+    rng = np.random.RandomState(rseed)
     n_num_items_scale = int(n_num_items * scale)
     item_release_time_scale = item_release_time[:n_num_items_scale]
 
@@ -68,7 +95,7 @@ def scale_down_data(scale, n_num_items, m_num_reqs, item_release_time, req_desir
     req_rental_length_scale = []
     m_num_reqs_scale = 0
     for i in range(m_num_reqs):
-        rand = np.random.rand()
+        rand = rng.rand()
         if rand <= scale:  # maintain w.p. scale
             m_num_reqs_scale += 1
             req_desired_time_scale.append(req_desired_time[i])
@@ -77,84 +104,156 @@ def scale_down_data(scale, n_num_items, m_num_reqs, item_release_time, req_desir
     return n_num_items_scale, m_num_reqs_scale, item_release_time_scale, req_desired_time_scale, req_rental_length_scale
 
 
-item_data_prefix = "data/itemdata_rseed"
-req_data_prefix = "data/reqdata_rseed"
-rseeds = list(range(1, 51)) #All results: range(1, 31)
-printsol = 1
-
-T = 182
-
-Q = 5*T
-
-m_num_reqs_list = []
-ub0_list = []
-ub1_list = []
-ub2_list = []
-for rs in rseeds:
-    item_filename = item_data_prefix + str(rs) + '.csv'
-    req_filename = req_data_prefix + str(rs) + '.csv'
-    n_num_items, m_num_reqs, item_release_time, req_order_time, req_desired_time, req_rental_length = load_data(item_filename, req_filename)
-    m_num_reqs_list.append(m_num_reqs)
-
-    ub0 = calc_itemtime_resource_UB_approx(n_num_items, T, item_release_time, req_rental_length)
-    ub0_list.append(round(ub0,4))
-
-    ub1 = calc_knapsack_UB(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol=0)
-    ub1_list.append(round(ub1, 4))
-
-    ub2 = calc_jobshop_sch_UB(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, Q, printsol=0)
-    ub2_list.append(round(ub2, 4))
-
-
-ub_LPrelax = 0
-ub3_scale = 1
-ub3_replica = 1
-
-ub3_list = []
-ub3_m_scale_list = []
-ub4_list = []
-m_num_reqs_list = []
-for rs in rseeds:
-    print("\nRunning ub3 & ub4 on rseed %d..."%rs)
-    item_filename = item_data_prefix + str(rs) + '.csv'
-    req_filename = req_data_prefix + str(rs) + '.csv'
-    n_num_items, m_num_reqs, item_release_time, req_order_time, req_desired_time, req_rental_length = load_data(item_filename, req_filename)
-    m_num_reqs_list.append(m_num_reqs)
-
-    # # UB3 - jobshop with time constr
-    # for r in range(ub3_replica):
-    #     if ub3_scale < 1:
-    #         n_num_items, m_num_reqs, item_release_time, req_desired_time, req_rental_length \
-    #             = scale_down_data(ub3_scale, n_num_items, m_num_reqs, item_release_time, req_desired_time, req_rental_length)
-    #     ub3 = calc_jobshop_sch_time_constraints_UB(n_num_items, m_num_reqs, T, item_release_time, req_order_time, req_desired_time, req_rental_length, Q, ub_LPrelax, printsol)
-    #
-    #     ub3_list.append(ub3)
-    #     ub3_m_scale_list.append(m_num_reqs)
-
-    # UB4 - schedule compatibility double time constr
-    ub4 = calc_schedule_compat_UB(n_num_items, m_num_reqs, T, req_order_time, req_desired_time, req_rental_length, Q, printsol=printsol)
-    ub4_list.append(ub4)
-
-
-# REPORT
-avg_m_num_reqs = np.mean(m_num_reqs_list)
-print("Avg num reqs: ", avg_m_num_reqs)
-
-print("\nEstimation in terms of resources")
-print(round(np.mean(ub0_list), 4))
-
-print("\nUB1 - Knapsack")
-srate1 = [ub1_list[i]/m_num_reqs_list[i] for i in range(len(ub1_list))]
-print(round(np.mean(srate1), 4))
-
-print("\nUB2 - Jobshop")
-srate2 = [ub2_list[i]/m_num_reqs_list[i] for i in range(len(ub2_list))]
-print(round(np.mean(srate2), 4))
-
-# print("\nUB3 - Jobshop Time Constrs, Scale %.2f, Replica %d" %(ub3_scale, ub3_replica))
-# srate3 = [ub3_list[i]/ub3_m_scale_list[i] for i in range(len(ub3_list))]
-# print(round(np.mean(srate3), 4))
-
-print("\nUB4 - Jobshop Time Constrs - One Item")
-srate4 = [ub4_list[i]/m_num_reqs_list[i] for i in range(len(ub4_list))]
-print(round(np.mean(srate4), 4))
\ No newline at end of file
+# Bound runner: every (rseed, bound) is one job, solved in a process pool. Results are cached on disk as one json
+# file per job, keyed by a hash of the job's data and model parameters, so reruns only solve what changed.
+# Bump BOUND_MODEL_VERSION whenever a bound model or greedy changes, so results cached by the old code are not reused.
+BOUND_MODEL_VERSION = 2
+
+def bound_job_key(job):
+    content = (BOUND_MODEL_VERSION, job['bound'], job['data'], sorted(job['model_paras'].items()))
+    return hashlib.sha1(repr(content).encode()).hexdigest()
+
+def solve_bound_job(job):
+    reset_solve_stats() # only this job's solves go back to the parent
+    n_num_items, m_num_reqs, item_release_time, req_order_time, req_desired_time, req_rental_length = job['data']
+    T, Q, LPrelax, backend, fast, aggregate, rolling = [job['model_paras'][k] for k in ['T', 'Q', 'LPrelax', 'backend', 'fast', 'aggregate', 'ub3_rolling']]
+    printsol = job['printsol']
+    validate = job['validate']
+    result = {}
+    if job['bound'] == 'ub1':
+        ub = calc_knapsack_UB(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, printsol, backend, fast, validate)
+    elif job['bound'] == 'ub2':
+        ub = calc_jobshop_sch_UB(n_num_items, m_num_reqs, T, item_release_time, req_rental_length, Q, printsol, backend, aggregate)
+    elif job['bound'] == 'ub3' and rolling is not None:
+        # rolling=(window, overlap): rolling-horizon decomposition for full instances; its bound is the UB3 value and
+        # the schedule it found and the gap between the two are reported next to it
+        schedule_val, ub, gap = jobshop_sch_time_constrs_rolling(n_num_items, m_num_reqs, T, item_release_time, req_order_time, req_desired_time, req_rental_length,
+                                                                 rolling[0], rolling[1], printsol=printsol, backend=backend)
+        result = {'schedule': schedule_val, 'gap': gap}
+    elif job['bound'] == 'ub3':
+        ub = calc_jobshop_sch_time_constraints_UB(n_num_items, m_num_reqs, T, item_release_time, req_order_time, req_desired_time, req_rental_length, Q, LPrelax, printsol, backend, aggregate)
+    else: # ub4
+        ub = calc_schedule_compat_UB(n_num_items, m_num_reqs, T, req_order_time, req_desired_time, req_rental_length, Q, printsol, backend, fast, validate)
+    result['ub'] = ub
+    return result, dict(solve_stats)
+
+def run_bound_jobs(jobs, workers=1, cache_dir=None):
+    # returns the result of every job, in job order: {'ub': bound} (rolling UB3 adds 'schedule' and 'gap');
+    # only the parent reads and writes the cache
+    results = [None] * len(jobs)
+    todo = []
+    for pos, job in enumerate(jobs):
+        cache_file = os.path.join(cache_dir, bound_job_key(job) + '.json') if cache_dir is not None else None
+        if cache_file is not None and os.path.exists(cache_file):
+            with open(cache_file) as f:
+                results[pos] = json.load(f)['result']
+        else:
+            todo.append((pos, cache_file))
+    print("Bound jobs: %d cached, %d to solve" % (len(jobs) - len(todo), len(todo)))
+
+    todo_jobs = [jobs[pos] for pos, _ in todo]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            solved = list(pool.map(solve_bound_job, todo_jobs))
+    else:
+        solved = [solve_bound_job(job) for job in todo_jobs]
+        reset_solve_stats() # merged back below, as for the workers
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+    for (pos, cache_file), job, (result, job_solve_stats) in zip(todo, todo_jobs, solved):
+        results[pos] = result
+        merge_solve_stats(job_solve_stats)
+        if cache_file is not None:
+            with open(cache_file, 'w') as f:
+                json.dump({'rseed': job['rseed'], 'bound': job['bound'], 'result': result}, f)
+    return results
+
+
+if __name__ == '__main__':
+    item_data_prefix = "data/itemdata_rseed"
+    req_data_prefix = "data/reqdata_rseed"
+    rseeds = list(range(1, 51)) #All results: range(1, 31)
+    printsol = 1 # ub3/ub4 only, as before
+    backend = None # gurobi, highs or cpsat (None: gurobi when installed, else highs)
+    bounds = ['ub1', 'ub2', 'ub4'] # add 'ub3' with ub3_rolling (or ub3_scale < 1): its exact model is too large for full instances
+    workers = 1 #>1 solves the bound jobs in a process pool
+    fast = 1 # UB1 and UB4 by their exact O(m log m) greedy instead of the MIP
+    validate = 0 # with fast, also solve the MIP and check the objectives agree (cached results are not re-checked)
+    aggregate = 0 # UB2/UB3 by the item flow models (size independent of the number of items; pays off at large inventories)
+    frontier_N = 0 #>0: also report UB0/UB1/UB4 for every inventory size n = 1..frontier_N (see capacity_frontier)
+    cache_dir = None # e.g. "data/bound_cache" to cache every job's bound on disk (None: no cache)
+
+    T = 182
+
+    Q = 5*T
+
+    ub_LPrelax = 0
+    ub3_scale = 1
+    ub3_rolling = None # e.g. (56, 14): (window, overlap) periods for UB3 on full instances; None: one exact model (scale it down)
+
+    jobs = []
+    m_num_reqs_list = []
+    ub0_list = []
+    frontiers = []
+    for rs in rseeds:
+        item_filename = item_data_prefix + str(rs) + '.csv'
+        req_filename = req_data_prefix + str(rs) + '.csv'
+        data = load_data(item_filename, req_filename)
+        n_num_items, m_num_reqs, item_release_time, req_order_time, req_desired_time, req_rental_length = data
+        m_num_reqs_list.append(m_num_reqs)
+
+        ub0 = calc_itemtime_resource_UB_approx(n_num_items, T, item_release_time, req_rental_length)
+        ub0_list.append(round(ub0,4))
+
+        if frontier_N > 0:
+            frontiers.append(capacity_frontier(frontier_N, m_num_reqs, T, item_release_time, req_desired_time, req_rental_length))
+
+        model_paras = {'T': T, 'Q': Q, 'LPrelax': ub_LPrelax, 'backend': backend, 'fast': fast, 'aggregate': aggregate,
+                       'ub3_rolling': ub3_rolling}
+        for bound in bounds:
+            job_data = data
+            if bound == 'ub3' and ub3_scale < 1: # the scaled-down data goes into the cache key as well
+                n_scale, m_scale, release_scale, desired_scale, length_scale \
+                    = scale_down_data(ub3_scale, n_num_items, m_num_reqs, item_release_time, req_desired_time, req_rental_length, rs)
+                job_data = (n_scale, m_scale, release_scale, req_order_time, desired_scale, length_scale)
+            jobs.append({'rseed': rs, 'bound': bound, 'data': job_data, 'model_paras': model_paras,
+                         'printsol': printsol if bound in ('ub3', 'ub4') else 0, 'validate': validate})
+
+    job_results = run_bound_jobs(jobs, workers, cache_dir)
+    ub_lists = {bound: [] for bound in bounds}
+    m_lists = {bound: [] for bound in bounds} # the job's own num reqs (ub3 may be scaled down)
+    ub3_schedule_list = []
+    ub3_gap_list = []
+    for job, result in zip(jobs, job_results):
+        ub = result['ub']
+        ub_lists[job['bound']].append(round(ub, 4) if job['bound'] in ('ub1', 'ub2') else ub)
+        m_lists[job['bound']].append(job['data'][1])
+        if 'schedule' in result:
+            ub3_schedule_list.append(result['schedule'] / job['data'][1])
+            ub3_gap_list.append(result['gap'])
+
+
+    # REPORT
+    avg_m_num_reqs = np.mean(m_num_reqs_list)
+    print("Avg num reqs: ", avg_m_num_reqs)
+
+    print("\nEstimation in terms of resources")
+    print(round(np.mean(ub0_list), 4))
+
+    bound_titles = {'ub1': "UB1 - Knapsack", 'ub2': "UB2 - Jobshop", 'ub3': "UB3 - Jobshop Time Constrs, Scale %.2f" % ub3_scale,
+                    'ub4': "UB4 - Jobshop Time Constrs - One Item"}
+    for bound in ['ub1', 'ub2', 'ub3', 'ub4']:
+        if bound in bounds:
+            print("\n" + bound_titles[bound])
+            srate = [ub_lists[bound][i]/m_lists[bound][i] for i in range(len(ub_lists[bound]))]
+            print(round(np.mean(srate), 4))
+            if bound == 'ub3' and ub3_schedule_list: # rolling: the bound is only as good as its gap to a schedule
+                print("Rolling schedule: %.4f, gap to bound: %.2f%%" % (np.mean(ub3_schedule_list), 100 * np.mean(ub3_gap_list)))
+
+    if frontiers:
+        print("\nCapacity frontier (avg over rseeds)")
+        print(pd.concat(frontiers).groupby('n').mean().round(4).to_string())
+
+    print("\nSolve time per backend")
+    print(report_solve_stats())